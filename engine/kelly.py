@@ -0,0 +1,78 @@
+import numpy as np
+
+# Simultaneous Kelly sizing for a slate of bets on different matches. Each bet wins independently
+# with its win rate, so the slate has 2^n joint outcomes; expected log growth is estimated on a fixed
+# sample of them and maximised by projected gradient ascent over the bankroll fractions.
+
+
+def sample_returns(win_rate, odds, num_samples, rng):
+    win_rate = np.asarray(win_rate, dtype=np.float64)
+    odds = np.asarray(odds, dtype=np.float64)
+    hits = rng.random((num_samples, len(win_rate))) < win_rate
+    return np.where(hits, odds - 1, -1.0)
+
+def expected_growth(fractions, returns):
+    return float(np.log1p(returns @ fractions).mean())
+
+def project_exposure(fractions, cap):
+    # Euclidean projection onto {f >= 0, sum(f) <= cap}.
+    clipped = np.maximum(fractions, 0.0)
+    if clipped.sum() <= cap:
+        return clipped
+    ordered = np.sort(fractions)[::-1]
+    excess = np.cumsum(ordered) - cap
+    ranks = np.arange(1, len(ordered) + 1)
+    active = ordered - excess / ranks > 0
+    shift = excess[active][-1] / ranks[active][-1]
+    return np.maximum(fractions - shift, 0.0)
+
+def optimize_fractions(returns, cap, start=None, max_iter=500, tol=1e-7):
+    if not 0 < cap < 1:
+        raise ValueError("Exposure cap must be a bankroll fraction between 0 and 1")
+    fractions = project_exposure(np.zeros(returns.shape[1]) if start is None else np.asarray(start, dtype=np.float64), cap)
+    wealth = 1 + returns @ fractions
+    growth = np.log(wealth).mean()
+    step = 1.0
+
+    for iteration in range(1, max_iter + 1):
+        gradient = (returns / wealth[:, None]).mean(axis=0)
+        # Backtracking: halve the step until the projected move gives a sufficient increase.
+        while True:
+            candidate = project_exposure(fractions + step * gradient, cap)
+            candidate_wealth = 1 + returns @ candidate
+            candidate_growth = np.log(candidate_wealth).mean()
+            if candidate_growth >= growth + 1e-4 * gradient @ (candidate - fractions) or step < 1e-10:
+                break
+            step *= 0.5
+        moved = np.abs(candidate - fractions).max()
+        if candidate_growth >= growth:
+            fractions, wealth, growth = candidate, candidate_wealth, candidate_growth
+        if moved < tol or step < 1e-10:
+            break
+        step *= 2
+    return fractions, float(growth), iteration
+
+def kelly_stakes(win_rate, odds, bankroll, exposure, baseline_stakes=None, num_samples=20000, min_stake=0.1, seed=0):
+    win_rate = np.asarray(win_rate, dtype=np.float64)
+    odds = np.asarray(odds, dtype=np.float64)
+    rng = np.random.default_rng(seed)
+    if not len(win_rate):
+        return {"stakes": np.zeros(0), "fractions": np.zeros(0), "kelly_growth": 0.0, "baseline_growth": 0.0, "iterations": 0}
+
+    returns = sample_returns(win_rate, odds, num_samples, rng)
+    baseline = None if baseline_stakes is None else np.asarray(baseline_stakes, dtype=np.float64) / bankroll
+    fractions, _, iterations = optimize_fractions(returns, exposure, start=baseline)
+
+    # Stakes below the bookmaker minimum are either dropped (Kelly says not to bet) or raised to it.
+    stakes = fractions * bankroll
+    stakes = np.where(stakes >= min_stake / 2, np.maximum(stakes, min_stake), 0.0).round(2)
+
+    # Growth is compared on fresh outcomes, so the optimised stakes get no in-sample advantage.
+    holdout = sample_returns(win_rate, odds, num_samples, rng)
+    return {
+        "stakes": stakes,
+        "fractions": fractions,
+        "kelly_growth": expected_growth(stakes / bankroll, holdout),
+        "baseline_growth": expected_growth(baseline, holdout) if baseline is not None else None,
+        "iterations": iterations,
+    }
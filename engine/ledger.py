@@ -0,0 +1,211 @@
+import numpy as np
+import pandas as pd
+
+PENDING, PLACED, FAILED, RESOLVED = 0, 1, 2, 3
+STATUS_NAMES = {PENDING: "pending", PLACED: "placed", FAILED: "failed", RESOLVED: "resolved"}
+
+BET_COLUMNS = ["match_id", "team", "side", "odds", "win_rate", "model_win_rate", "ev", "risk", "strategy", "placed", "timestamp", "hit", "payout", "profit"]
+PAST_BET_COLUMNS = ["match_id", "team", "side", "odds", "win_rate", "model_win_rate", "ev", "risk", "strategy", "placed", "timestamp", "outcome", "hit", "payout", "profit", "league"]
+LEDGER_COLUMNS = PAST_BET_COLUMNS + ["search_query", "home_team", "away_team"]
+FLOAT_COLUMNS = {"odds", "win_rate", "model_win_rate", "ev", "risk", "payout", "profit"}
+
+# Table each status is persisted to; pending bets only live for the session.
+STATUS_TABLES = {RESOLVED: "past_bets", PLACED: "placed_bets", FAILED: "failed_bets"}
+TABLE_COLUMNS = {"past_bets": PAST_BET_COLUMNS, "placed_bets": BET_COLUMNS, "failed_bets": BET_COLUMNS}
+
+TRANSITIONS = {
+    PENDING: {PLACED, FAILED},
+    PLACED: {RESOLVED},
+    FAILED: set(),
+    RESOLVED: set(),
+}
+
+
+class BetLedger():
+    def __init__(self, capacity=1024) -> None:
+        self.size = 0
+        self._capacity = capacity
+        self._columns = {
+            col: np.full(capacity, np.nan) if col in FLOAT_COLUMNS else np.full(capacity, None, dtype=object)
+            for col in LEDGER_COLUMNS
+        }
+        self._status = np.zeros(capacity, dtype=np.int8)
+        # Status and storage row id as of the last load/save, used to work out what changed.
+        self._saved_status = np.full(capacity, -1, dtype=np.int8)
+        self._source_id = np.full(capacity, -1, dtype=np.int64)
+        # match_id -> rows (in row order) of bets that are still open (pending or placed). A slate can hold
+        # the same match_id twice, so each id keeps all its rows and record() takes the oldest pending one.
+        self._open = {PENDING: {}, PLACED: {}}
+        # Columns a loaded table had beyond the ledger's own; kept so saving the table writes them back.
+        self._extra = {}
+        self._table_extras = {table: [] for table in TABLE_COLUMNS}
+
+    def __len__(self):
+        return self.size
+
+    def _reserve(self, extra):
+        needed = self.size + extra
+        if needed <= self._capacity:
+            return
+        capacity = max(needed, 2 * self._capacity)
+        for col, values in self._columns.items():
+            grown = np.full(capacity, np.nan) if col in FLOAT_COLUMNS else np.full(capacity, None, dtype=object)
+            grown[:self.size] = values[:self.size]
+            self._columns[col] = grown
+        for col, values in self._extra.items():
+            grown = np.full(capacity, None, dtype=object)
+            grown[:self.size] = values[:self.size]
+            self._extra[col] = grown
+        for name, fill in (("_status", 0), ("_saved_status", -1), ("_source_id", -1)):
+            grown = np.full(capacity, fill, dtype=getattr(self, name).dtype)
+            grown[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, grown)
+        self._capacity = capacity
+
+    def _index(self, rows, status):
+        if status in self._open:
+            index = self._open[status]
+            for row, match_id in zip(rows.tolist(), self._columns["match_id"][rows].tolist()):
+                index.setdefault(match_id, []).append(row)
+
+    def _unindex(self, rows, status):
+        if status in self._open:
+            index = self._open[status]
+            for row, match_id in zip(rows.tolist(), self._columns["match_id"][rows].tolist()):
+                open_rows = index.get(match_id, [])
+                if row in open_rows:
+                    open_rows.remove(row)
+                    if not open_rows:
+                        del index[match_id]
+
+    def _buffer(self, col):
+        return self._columns[col] if col in self._columns else self._extra[col]
+
+    def extend(self, frame, status, saved=False):
+        rows = np.arange(self.size, self.size + len(frame))
+        if not len(frame):
+            return rows
+        self._reserve(len(frame))
+        for col in LEDGER_COLUMNS:
+            if col not in frame:
+                continue
+            values = frame[col].to_numpy(dtype=np.float64 if col in FLOAT_COLUMNS else object, na_value=np.nan if col in FLOAT_COLUMNS else None)
+            self._columns[col][rows] = values
+        for col in frame.columns:
+            if col in self._columns:
+                continue
+            if col not in self._extra:
+                self._extra[col] = np.full(self._capacity, None, dtype=object)
+            self._extra[col][rows] = frame[col].to_numpy(dtype=object)
+            table = STATUS_TABLES.get(status)
+            if table is not None and col not in TABLE_COLUMNS[table] and col not in self._table_extras[table]:
+                self._table_extras[table].append(col)
+        self._status[rows] = status
+        if saved:
+            self._saved_status[rows] = status
+            if frame.index.name == "id":
+                self._source_id[rows] = frame.index.to_numpy()
+        self.size += len(frame)
+        self._index(rows, status)
+        return rows
+
+    def append(self, values, status):
+        row = self.size
+        self._reserve(1)
+        for col in LEDGER_COLUMNS:
+            self._columns[col][row] = values.get(col, np.nan if col in FLOAT_COLUMNS else None)
+        self._status[row] = status
+        self.size += 1
+        self._index(np.array([row]), status)
+        return row
+
+    def update(self, row, values):
+        for col, value in values.items():
+            if col in self._columns:
+                self._columns[col][row] = value
+
+    def transition(self, rows, status):
+        rows = np.atleast_1d(np.asarray(rows, dtype=np.int64))
+        for current in np.unique(self._status[rows]).tolist():
+            if status not in TRANSITIONS[current]:
+                raise ValueError(f"Bet cannot move from {STATUS_NAMES[current]} to {STATUS_NAMES[status]}")
+        for current in np.unique(self._status[rows]).tolist():
+            self._unindex(rows[self._status[rows] == current], current)
+        self._status[rows] = status
+        self._index(rows, status)
+
+    def find(self, match_id, status):
+        open_rows = self._open[status].get(match_id)
+        return open_rows[0] if open_rows else None
+
+    def is_placed(self, match_id):
+        return match_id in self._open[PLACED]
+
+    def record(self, values, status):
+        # Moves the oldest pending bet with this match_id to status, or appends it when it was never pending.
+        # Bets are recorded in slate order, so duplicate ids each land on their own row.
+        row = self.find(values["match_id"], PENDING)
+        if row is None:
+            row = self.append(values, PENDING)
+        self.update(row, values)
+        self.transition(row, status)
+        return row
+
+    def resolve(self, rows, outcome, hit, payout, profit, league=None):
+        rows = np.asarray(rows, dtype=np.int64)
+        self.transition(rows, RESOLVED)
+        self._columns["outcome"][rows] = outcome
+        self._columns["hit"][rows] = hit
+        self._columns["payout"][rows] = payout
+        self._columns["profit"][rows] = profit
+        # Kept with the settled bet so the calibration store's per-league totals can be rebuilt from history.
+        if league is not None:
+            self._columns["league"][rows] = league
+
+    def clear_pending(self):
+        # Pending rows that were never acted on are dropped from the open index.
+        rows = self.rows(PENDING)
+        self._unindex(rows, PENDING)
+        return rows
+
+    def rows(self, status):
+        return np.flatnonzero(self._status[:self.size] == status)
+
+    def count(self, status):
+        return int(np.count_nonzero(self._status[:self.size] == status))
+
+    def to_frame(self, status=None, columns=None, rows=None):
+        if rows is None:
+            rows = np.arange(self.size) if status is None else self.rows(status)
+        columns = columns or LEDGER_COLUMNS
+        frame = pd.DataFrame({col: self._buffer(col)[rows] for col in columns}, index=pd.Index(rows, name="row"))
+        return frame
+
+    def table(self, table):
+        status = next(s for s, t in STATUS_TABLES.items() if t == table)
+        return self.to_frame(status, TABLE_COLUMNS[table] + self._table_extras[table]).reset_index(drop=True)
+
+    def changes(self):
+        # Rows whose status moved since the last load/save: deletes from their old table (by storage id)
+        # and inserts into their new one.
+        current = self._status[:self.size]
+        saved = self._saved_status[:self.size]
+        changed = current != saved
+        deletes, inserts = {}, {}
+        for status, table in STATUS_TABLES.items():
+            left = np.flatnonzero(changed & (saved == status) & (self._source_id[:self.size] >= 0))
+            if len(left):
+                deletes[table] = self._source_id[left].tolist()
+            entered = np.flatnonzero(changed & (current == status))
+            if len(entered):
+                inserts[table] = entered
+        return deletes, inserts
+
+    def mark_saved(self, rows=None, source_ids=None):
+        if rows is None:
+            persisted = np.isin(self._status[:self.size], list(STATUS_TABLES))
+            self._saved_status[:self.size] = np.where(persisted, self._status[:self.size], -1)
+        else:
+            self._saved_status[rows] = self._status[rows]
+            if source_ids is not None:
+                self._source_id[rows] = source_ids
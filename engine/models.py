@@ -1,8 +1,10 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, fields, MISSING
 from typing import Optional
 from datetime import datetime
+import numpy as np
+import pandas as pd
 
-@dataclass
+@dataclass(slots=True)
 class Bet:
     match_id: str
     team: str
@@ -20,4 +22,46 @@ class Bet:
     hit: Optional[bool] = None
     payout: Optional[float] = None
     profit: Optional[float] = None
-    outcome: Optional[str] = None
\ No newline at end of file
+    outcome: Optional[str] = None
+    model_win_rate: Optional[float] = None
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*(row.get(name, default) for name, default in BET_DEFAULTS.items()))
+
+    def to_dict(self, columns=None):
+        return {name: getattr(self, name) for name in (columns or BET_FIELDS)}
+
+BET_FIELDS = tuple(f.name for f in fields(Bet))
+BET_DEFAULTS = {f.name: None if f.default is MISSING else f.default for f in fields(Bet)}
+FLOAT_FIELDS = {"odds", "win_rate", "model_win_rate", "ev", "risk", "payout", "profit"}
+
+
+class BetBatch():
+    # Many bets as one typed array per field: float64 for prices and money, object for the rest.
+    # float64 columns are shared with the frame in both directions (read-only views from from_frame);
+    # the object fields are converted, which copies.
+    def __init__(self, columns, size) -> None:
+        self.columns = columns
+        self.size = size
+
+    @classmethod
+    def from_frame(cls, frame):
+        columns = {}
+        for name, default in BET_DEFAULTS.items():
+            if name in FLOAT_FIELDS:
+                columns[name] = frame[name].to_numpy(dtype=np.float64, na_value=np.nan) if name in frame else np.full(len(frame), np.nan if default is None else default, dtype=np.float64)
+            else:
+                columns[name] = frame[name].to_numpy(dtype=object) if name in frame else np.full(len(frame), default, dtype=object)
+        return cls(columns, len(frame))
+
+    def to_frame(self, columns=None):
+        return pd.DataFrame({name: self.columns[name] for name in (columns or BET_FIELDS)}, copy=False)
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        # Converting each column once is much cheaper than building a Series per row.
+        for values in zip(*(self.columns[name].tolist() for name in BET_FIELDS)):
+            yield Bet(*values)
@@ -0,0 +1,36 @@
+import numpy as np
+
+# Column order of the probability/odds arrays. Matches the order the per-match ev_map was built in,
+# so argmax breaks ties between sides the same way max() over that dict did.
+SCORED_SIDES = np.array(["home", "away", "draw"])
+
+
+def score_fixtures(probs, odds, ev_threshold):
+    # probs, odds: (n_fixtures, 3) arrays in SCORED_SIDES order.
+    probs = np.asarray(probs, dtype=np.float64)
+    odds = np.asarray(odds, dtype=np.float64)
+    ev = probs * (odds - 1) - (1 - probs)
+
+    best = np.argmax(ev, axis=1)
+    rows = np.arange(len(ev))
+    best_ev = ev[rows, best]
+    keep = best_ev >= ev_threshold
+    return {
+        "rows": rows[keep],
+        "side": SCORED_SIDES[best[keep]],
+        "side_index": best[keep],
+        "odds": odds[rows, best][keep],
+        "win_rate": probs[rows, best][keep],
+        "ev": best_ev[keep],
+    }
+
+def size_stakes(ev, beta, weekly_exposure, initial_bankroll, min_stake=0.1):
+    ev = np.asarray(ev, dtype=np.float64)
+    budget = weekly_exposure * initial_bankroll
+    weight = 1 + ev * beta
+    # Small slates are staked flat at a fifth of the budget each, larger ones split it by weight.
+    if len(ev) > 5:
+        stake = budget * weight / weight.sum()
+    else:
+        stake = np.full(len(ev), budget / 5)
+    return np.round(np.maximum(stake, min_stake), 2)
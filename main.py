@@ -19,23 +19,28 @@ if __name__ == "__main__":
     data_loader = DataLoader(data_dir, "config.yaml")
     executor = Executor(data_loader=data_loader)
 
-    print("[INFO] Resolving past bets...")
-    data_loader.resolve_past_bets()
+    # The pooled Chromium is closed and its report printed however the session ends.
+    try:
+        print("[INFO] Resolving past bets...")
+        data_loader.resolve_past_bets()
     
 
-    if not args.update:
-        print("[INFO] Generating new bets...")
-        pending_bets = data_loader.get_new_bets()
-        print(data_loader.pending_bets)
-        if args.min_risk:
-            print("[MIN RISK] Overriding risk to 0.1 EUR per bet")
-            pending_bets["risk"] = 0.1
+        if not args.update:
+            print("[INFO] Generating new bets...")
+            pending_bets = data_loader.get_new_bets()
+            print(data_loader.pending_bets)
+            if args.min_risk:
+                print("[MIN RISK] Overriding risk to 0.1 EUR per bet")
+                pending_bets["risk"] = 0.1
 
-        if args.limit:
-            pending_bets = pending_bets.head(args.limit)
+            if args.limit:
+                pending_bets = pending_bets.head(args.limit)
 
-        print(f"[INFO] Placing {len(pending_bets)} bets...")
-        executor.place_bets(pending_bets=pending_bets)
+            print(f"[INFO] Placing {len(pending_bets)} bets...")
+            executor.place_bets(pending_bets=pending_bets)
 
-    data_loader.save_all()
+        data_loader.save_all()
+    finally:
+        browser_report = data_loader.browser_mgr.close()
+        print(f"[INFO] Browser pool: {browser_report}")
     print("[INFO] Session complete.")
\ No newline at end of file
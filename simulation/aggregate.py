@@ -0,0 +1,187 @@
+import math
+from statistics import NormalDist
+import numpy as np
+import pandas as pd
+
+METRICS = ["final_bankroll", "roi", "max_drawdown", "volatility", "sharpe_ratio", "underwater_time", "simulated_hit_rate"]
+SKETCHED_METRICS = ["final_bankroll", "max_drawdown", "roi"]
+
+
+class RunningStats():
+    def __init__(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return
+        other = RunningStats()
+        other.count = len(values)
+        other.mean = float(values.mean())
+        other.m2 = float(((values - other.mean) ** 2).sum())
+        other.min = float(values.min())
+        other.max = float(values.max())
+        self.merge(other)
+
+    def merge(self, other):
+        # Chan et al. pairwise combination of two Welford states.
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self):
+        return self.m2 / self.count if self.count else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+
+class QuantileSketch():
+    # Log-bucketed sketch: every quantile is within relative_accuracy of an exact value,
+    # memory grows with log(range) instead of the sample count, and two sketches merge by adding buckets.
+    def __init__(self, relative_accuracy=0.01, min_value=1e-9) -> None:
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+        self.positive = {}
+        self.negative = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def _add(self, store, values):
+        keys, counts = np.unique(np.ceil(np.log(values) / self.log_gamma).astype(np.int64), return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            store[key] = store.get(key, 0) + count
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        positive = values > self.min_value
+        negative = values < -self.min_value
+        if positive.any():
+            self._add(self.positive, values[positive])
+        if negative.any():
+            self._add(self.negative, -values[negative])
+        self.zero_count += int(len(values) - positive.sum() - negative.sum())
+        self.count += len(values)
+
+    def merge(self, other):
+        for store, other_store in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, count in other_store.items():
+                store[key] = store.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def _value(self, key):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def quantile(self, q):
+        if not self.count:
+            return math.nan
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -self._value(key)
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(max(self.positive))
+
+
+class SimulationAggregator():
+    def __init__(self, keep_paths=False, quantiles=(0.05, 0.5, 0.95), relative_accuracy=0.01) -> None:
+        self.keep_paths = keep_paths
+        self.quantiles = quantiles
+        self.stats = {metric: RunningStats() for metric in METRICS}
+        self.sketches = {metric: QuantileSketch(relative_accuracy) for metric in SKETCHED_METRICS}
+        self.ruined_count = 0
+        self.count = 0
+        self.precision = None
+        self._paths = []
+
+    def update(self, batch):
+        for metric, stats in self.stats.items():
+            stats.update(batch[metric])
+        for metric, sketch in self.sketches.items():
+            sketch.update(batch[metric])
+        self.ruined_count += int(np.count_nonzero(batch["ruined"]))
+        self.count += len(batch["ruined"])
+        if self.keep_paths:
+            self._paths.append(batch)
+
+    def merge(self, other):
+        for metric, stats in self.stats.items():
+            stats.merge(other.stats[metric])
+        for metric, sketch in self.sketches.items():
+            sketch.merge(other.sketches[metric])
+        self.ruined_count += other.ruined_count
+        self.count += other.count
+        if self.keep_paths:
+            self._paths.extend(other._paths)
+
+    @property
+    def ruin_probability(self):
+        return self.ruined_count / self.count if self.count else 0.0
+
+    @property
+    def paths(self):
+        if not self.keep_paths or not self._paths:
+            return None
+        return pd.DataFrame({col: np.concatenate([p[col] for p in self._paths]) for col in self._paths[0]})
+
+    def mean(self, metric):
+        if metric == "ruined":
+            return self.ruin_probability
+        return self.stats[metric].mean
+
+    def std(self, metric):
+        return self.stats[metric].std
+
+    def quantile(self, metric, q):
+        return self.sketches[metric].quantile(q)
+
+    def confidence_interval(self, metric, confidence=0.95):
+        stats = self.stats[metric]
+        if not stats.count:
+            return (math.nan, math.nan)
+        half_width = NormalDist().inv_cdf(0.5 + confidence / 2) * stats.std / math.sqrt(stats.count)
+        return (stats.mean - half_width, stats.mean + half_width)
+
+    def ruin_confidence_interval(self, confidence=0.95):
+        # Wilson score interval, which stays sensible when ruin is rare or absent.
+        if not self.count:
+            return (0.0, 1.0)
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        p = self.ruin_probability
+        denominator = 1 + z ** 2 / self.count
+        centre = (p + z ** 2 / (2 * self.count)) / denominator
+        half_width = z * math.sqrt(p * (1 - p) / self.count + z ** 2 / (4 * self.count ** 2)) / denominator
+        return (max(0.0, centre - half_width), min(1.0, centre + half_width))
+
+    def summary(self):
+        rows = []
+        for metric, stats in self.stats.items():
+            row = {"metric": metric, "mean": stats.mean, "std": stats.std, "min": stats.min, "max": stats.max}
+            for q in self.quantiles:
+                row[f"p{round(q * 100):g}"] = self.quantile(metric, q) if metric in self.sketches else math.nan
+            rows.append(row)
+        rows.append({"metric": "ruined", "mean": self.ruin_probability})
+        return pd.DataFrame(rows).set_index("metric")
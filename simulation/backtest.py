@@ -0,0 +1,129 @@
+import argparse
+import itertools
+import numpy as np
+import pandas as pd
+from utils.config_manager import ConfigManager
+from utils.ledger_store import LedgerStore
+
+
+def load_history(past_bets, strategy=None, slate_freq="W"):
+    if isinstance(past_bets, pd.DataFrame):
+        data = past_bets
+    elif str(past_bets).endswith(".sqlite"):
+        store = LedgerStore(past_bets)
+        data = store.read("past_bets", columns=["side", "odds", "ev", "strategy", "timestamp", "outcome", "hit"])
+        store.close()
+    else:
+        data = pd.read_csv(past_bets)
+    if strategy is not None:
+        data = data[data["strategy"] == strategy]
+
+    # Only settled bets can be replayed; the outcome column is authoritative when present.
+    if "outcome" in data:
+        data = data[data["outcome"].notna()]
+        hit = (data["outcome"] == data["side"]).to_numpy()
+    else:
+        data = data[data["hit"].notna()]
+        hit = data["hit"].astype(str).str.lower().isin(["true", "1", "1.0"]).to_numpy()
+
+    timestamp = pd.to_datetime(data["timestamp"], errors="coerce")
+    dated = timestamp.notna().to_numpy()
+    data, timestamp, hit = data[dated], timestamp[dated], hit[dated]
+    order = np.argsort(timestamp.to_numpy(), kind="stable")
+    timestamp = timestamp.iloc[order]
+    slates = timestamp.dt.to_period(slate_freq)
+    slate_codes, slate_labels = pd.factorize(slates, sort=True)
+
+    return {
+        "odds": data["odds"].to_numpy(dtype=np.float64)[order],
+        "ev": data["ev"].to_numpy(dtype=np.float64)[order],
+        "hit": hit[order],
+        "slate_starts": np.flatnonzero(np.r_[True, np.diff(slate_codes) != 0]),
+        "slates": slate_labels.astype(str),
+    }
+
+def make_strategies(ev_thresholds, betas, exposures, min_stakes=(0.1,)):
+    return pd.DataFrame(
+        list(itertools.product(ev_thresholds, betas, exposures, min_stakes)),
+        columns=["ev_threshold", "beta", "weekly_exposure", "min_stake"],
+    )
+
+def _replay_block(history, strategies, initial_bankroll):
+    ev, odds, starts = history["ev"], history["odds"], history["slate_starts"]
+    threshold = strategies["ev_threshold"].to_numpy()[:, None]
+    beta = strategies["beta"].to_numpy()[:, None]
+    budget = strategies["weekly_exposure"].to_numpy()[:, None] * initial_bankroll
+    min_stake = strategies["min_stake"].to_numpy()[:, None]
+
+    # Same sizing rule as engine.scoring.size_stakes, applied to every slate of every strategy at once.
+    selected = ev[None, :] >= threshold
+    weight = np.where(selected, 1 + ev[None, :] * beta, 0.0)
+    slate_index = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(ev)]))
+    slate_weight = np.add.reduceat(weight, starts, axis=1)[:, slate_index]
+    slate_count = np.add.reduceat(selected.astype(np.int64), starts, axis=1)[:, slate_index]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        stake = np.where(slate_count > 5, budget * weight / slate_weight, budget / 5)
+    stake = np.where(selected, np.round(np.maximum(stake, min_stake), 2), 0.0)
+    profit = stake * np.where(history["hit"], odds - 1, -1.0)[None, :]
+
+    slate_profit = np.add.reduceat(profit, starts, axis=1)
+    bankroll = initial_bankroll + np.cumsum(slate_profit, axis=1)
+    peak = np.maximum.accumulate(np.maximum(bankroll, initial_bankroll), axis=1)
+
+    staked = stake.sum(axis=1)
+    bets = selected.sum(axis=1)
+    profit_std = slate_profit.std(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        metrics = pd.DataFrame({
+            "bets": bets,
+            "hit_rate": np.where(bets > 0, (selected & history["hit"][None, :]).sum(axis=1) / np.maximum(bets, 1), np.nan),
+            "total_staked": staked,
+            "profit": bankroll[:, -1] - initial_bankroll,
+            "yield": np.where(staked > 0, (bankroll[:, -1] - initial_bankroll) / staked, np.nan),
+            "final_bankroll": bankroll[:, -1],
+            "roi": (bankroll[:, -1] - initial_bankroll) / initial_bankroll,
+            "max_drawdown": (peak - bankroll).max(axis=1),
+            "sharpe_ratio": np.where(profit_std > 0, slate_profit.mean(axis=1) / profit_std, 0.0),
+        })
+    return metrics, bankroll
+
+def backtest(history, strategies, initial_bankroll=100, block_size=256):
+    if not len(history["ev"]):
+        raise ValueError("No resolved bets to replay")
+
+    metrics, curves = [], []
+    for start in range(0, len(strategies), block_size):
+        block = strategies.iloc[start:start + block_size]
+        block_metrics, block_curves = _replay_block(history, block, initial_bankroll)
+        metrics.append(block_metrics)
+        curves.append(block_curves)
+
+    results = pd.concat([strategies.reset_index(drop=True), pd.concat(metrics, ignore_index=True)], axis=1)
+    curves = pd.DataFrame(np.vstack(curves), columns=history["slates"])
+    return results, curves
+
+if __name__ == "__main__":
+    config_mgr = ConfigManager("config.yaml")
+
+    parser = argparse.ArgumentParser(description="Replay the resolved bet ledger under candidate strategies")
+    parser.add_argument("--data", default="data/past_bets.csv", help="past_bets.csv or a ledger.sqlite store")
+    parser.add_argument("--strategy-tag", help="Only replay bets placed under this strategy tag")
+    parser.add_argument("--ev-threshold", type=float, nargs="+", default=[config_mgr.get_setting("ev_threshold", 0.1)])
+    parser.add_argument("--beta", type=float, nargs="+", default=[config_mgr.get_setting("beta", 2)])
+    parser.add_argument("--exposure", type=float, nargs="+", default=[config_mgr.get_setting("weekly_exposure", 0.1)])
+    parser.add_argument("--min-stake", type=float, nargs="+", default=[0.1])
+    parser.add_argument("--initial-bankroll", type=float, default=config_mgr.get_setting("initial_bankroll", 100))
+    parser.add_argument("--slate-freq", default="W", help="Pandas period used to group bets into one staking slate")
+    parser.add_argument("--output", help="Optional prefix for <prefix>_metrics.csv and <prefix>_curves.csv")
+    args = parser.parse_args()
+
+    history = load_history(args.data, strategy=args.strategy_tag, slate_freq=args.slate_freq)
+    strategies = make_strategies(args.ev_threshold, args.beta, args.exposure, args.min_stake)
+    results, curves = backtest(history, strategies, initial_bankroll=args.initial_bankroll)
+
+    pd.set_option("display.max_columns", None)
+    print(results.sort_values("roi", ascending=False).to_string(index=False))
+    if args.output:
+        results.to_csv(f"{args.output}_metrics.csv", index=False)
+        curves.to_csv(f"{args.output}_curves.csv", index=False)
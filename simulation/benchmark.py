@@ -0,0 +1,162 @@
+import argparse
+import json
+import platform
+import time
+import tracemalloc
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from simulation.monte_carlo import (
+    get_simulation_data,
+    bin_data,
+    sample_data,
+    simulate_step,
+    to_batch_data,
+    draw_batch,
+    evaluate_batch,
+    split_batches,
+    BET_SIDES,
+)
+from simulation.aggregate import SimulationAggregator
+from simulation.parallel import simulate_monte_carlo_parallel
+
+ENGINES = ["legacy", "batch", "parallel"]
+
+
+def generate_past_bets(num_rows, seed=0, margin=0.05):
+    rng = np.random.default_rng(seed)
+
+    # Model probabilities around typical football 1X2 prices, then bookmaker odds that are noisy
+    # around the fair price so a realistic share of bets clears the EV threshold.
+    home = rng.uniform(0.15, 0.7, num_rows)
+    draw = rng.uniform(0.18, 0.32, num_rows)
+    away = np.clip(1 - home - draw, 0.05, None)
+    probs = np.stack([home, draw, away], axis=1)
+    probs /= probs.sum(axis=1, keepdims=True)
+
+    odds = np.round(1 / (probs * (1 + margin)) * rng.lognormal(0, 0.12, probs.shape), 2)
+    odds = np.clip(odds, 1.01, 19.5)
+    evs = probs * odds - 1
+    bet = evs.argmax(axis=1)
+
+    cumulative = probs.cumsum(axis=1)
+    outcome = (rng.random(num_rows)[:, None] > cumulative[:, :2]).sum(axis=1)
+
+    sides = np.array(BET_SIDES, dtype=object)
+    frame = {"bet": sides[bet], "outcome": sides[outcome]}
+    for code, side in enumerate(BET_SIDES):
+        frame[f"odds_{side}"] = odds[:, code]
+    for code, side in enumerate(BET_SIDES):
+        frame[f"{side}_win_%"] = np.round(probs[:, code], 2)
+    frame["ev"] = np.round(evs[np.arange(num_rows), bet], 2)
+    return pd.DataFrame(frame)
+
+
+class StageTimer():
+    def __init__(self) -> None:
+        self.stages = {}
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def timed(self, stage, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.add(stage, time.perf_counter() - start)
+        return result
+
+
+def _run_legacy(past_bets, num_simulations, params, seed, timer):
+    # Mirrors single_monte_carlo stage by stage, including the per-simulation prepare and bin work.
+    rng = np.random.default_rng(seed)
+    for _ in range(num_simulations):
+        data = timer.timed("prepare", get_simulation_data, past_bets, threshold=params["ev_treshold"])
+        data, bin_counts = timer.timed("bin", bin_data, data)
+        sampled = timer.timed("sample", sample_data, data, bin_counts, 600, rng=rng)
+
+        start = time.perf_counter()
+        bankroll = params["initial_balance"]
+        for i in range(len(sampled) // 20):
+            profit, _ = simulate_step(sampled.iloc[i * 20:(i + 1) * 20], initial_balance=bankroll, max_risk=params["max_risk"], beta=params["beta"], rng=rng)
+            bankroll += profit
+            if bankroll <= params["ruin_threshold"] * params["initial_balance"]:
+                break
+        timer.add("step", time.perf_counter() - start)
+
+def _run_batch(past_bets, num_simulations, params, seed, timer, batch_size=5000):
+    data = timer.timed("prepare", get_simulation_data, past_bets, threshold=params["ev_treshold"])
+    batch_data = to_batch_data(*timer.timed("bin", bin_data, data))
+
+    aggregator = SimulationAggregator()
+    for size, batch_seed in split_batches(num_simulations, batch_size, seed):
+        draws = timer.timed("sample", draw_batch, batch_data, size, np.random.default_rng(batch_seed))
+        batch = timer.timed("step", evaluate_batch, batch_data, draws, params["initial_balance"], params["beta"], params["max_risk"], params["ruin_threshold"])
+        timer.timed("aggregate", aggregator.update, batch)
+
+def _run_parallel(past_bets, num_simulations, params, seed, timer, workers=None):
+    # Stages run inside the workers, so only the end-to-end time is reported and the memory peak
+    # covers the parent process only.
+    timer.timed("total", simulate_monte_carlo_parallel, past_bets, num_simulations, seed=seed, workers=workers, **params)
+
+def benchmark_engine(engine, past_bets, num_simulations, params, seed=0, workers=None):
+    timer = StageTimer()
+    tracemalloc.start()
+    start = time.perf_counter()
+    if engine == "legacy":
+        _run_legacy(past_bets, num_simulations, params, seed, timer)
+    elif engine == "batch":
+        _run_batch(past_bets, num_simulations, params, seed, timer)
+    elif engine == "parallel":
+        _run_parallel(past_bets, num_simulations, params, seed, timer, workers=workers)
+    else:
+        raise ValueError(f"Unknown engine: {engine}")
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "engine": engine,
+        "rows": len(past_bets),
+        "simulations": num_simulations,
+        "seconds": seconds,
+        "simulations_per_second": num_simulations / seconds if seconds else None,
+        "stages": timer.stages,
+        "peak_memory_mb": peak / 2 ** 20,
+    }
+
+def run_benchmarks(row_counts, engines, simulations, legacy_simulations=20, params=None, seed=0, workers=None):
+    params = params or {"initial_balance": 100, "beta": 2, "max_risk": 0.3, "ruin_threshold": 0.5, "ev_treshold": 0.1}
+    results = []
+    for num_rows in row_counts:
+        past_bets = generate_past_bets(num_rows, seed=seed)
+        for engine in engines:
+            num_simulations = legacy_simulations if engine == "legacy" else simulations
+            result = benchmark_engine(engine, past_bets, num_simulations, params, seed=seed, workers=workers)
+            print(f"[BENCH] {engine:<8} rows={num_rows:<9} sims={num_simulations:<8} {result['simulations_per_second']:.1f} sims/s, peak {result['peak_memory_mb']:.1f} MB")
+            results.append(result)
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "params": params,
+        "results": results,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monte Carlo simulator benchmark")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 100000])
+    parser.add_argument("--engines", nargs="+", default=ENGINES, choices=ENGINES)
+    parser.add_argument("--simulations", type=int, default=100000)
+    parser.add_argument("--legacy-simulations", type=int, default=20)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_output.json")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.rows, args.engines, args.simulations, args.legacy_simulations, seed=args.seed, workers=args.workers)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[INFO] Benchmark written to {args.output}")
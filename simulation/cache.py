@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+import numpy as np
+from utils.atomic import atomic_write
+
+CACHE_VERSION = 1
+
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def cache_dir_for(source):
+    source = Path(source)
+    return source.parent / ".sim_cache" / source.stem
+
+def _read_meta(cache_dir):
+    try:
+        with open(cache_dir / "meta.json") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def _write_json(path, payload):
+    with atomic_write(path) as f:
+        json.dump(payload, f, indent=2)
+
+def _is_current(source, cache_dir, meta):
+    if meta is None or meta.get("version") != CACHE_VERSION:
+        return False
+    if not all((cache_dir / f"{name}.npy").exists() for name in meta["columns"]):
+        return False
+    stat = os.stat(source)
+    if stat.st_size != meta["size"]:
+        return False
+    if stat.st_mtime_ns == meta["mtime_ns"]:
+        return True
+    # Touched but maybe not changed (e.g. a copy or a rewrite with the same rows): compare contents.
+    if file_hash(source) != meta["hash"]:
+        return False
+    meta["mtime_ns"] = stat.st_mtime_ns
+    _write_json(cache_dir / "meta.json", meta)
+    return True
+
+def write_cache(source, cache_dir, arrays):
+    os.makedirs(cache_dir, exist_ok=True)
+    stat = os.stat(source)
+    source_hash = file_hash(source)
+    for name, values in arrays.items():
+        # Replaced file by file: processes that already mapped the old arrays keep reading the old inode.
+        with atomic_write(cache_dir / f"{name}.npy", "wb") as f:
+            np.save(f, np.ascontiguousarray(values))
+    # meta.json is written last, so a half written cache is never taken as current.
+    _write_json(cache_dir / "meta.json", {
+        "version": CACHE_VERSION,
+        "source": str(Path(source).resolve()),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "hash": source_hash,
+        "columns": list(arrays),
+        "rows": len(next(iter(arrays.values()))) if arrays else 0,
+    })
+
+def load_cached_arrays(source, build, cache_dir=None):
+    # Arrays derived from source by build(source), memory mapped read-only from .npy files and
+    # rebuilt only when the source's size, mtime and content hash no longer match.
+    cache_dir = Path(cache_dir) if cache_dir is not None else cache_dir_for(source)
+    meta = _read_meta(cache_dir)
+    if not _is_current(source, cache_dir, meta):
+        write_cache(source, cache_dir, build(source))
+        meta = _read_meta(cache_dir)
+    # Zero length arrays cannot be mapped.
+    mmap_mode = "r" if meta["rows"] else None
+    return {name: np.load(cache_dir / f"{name}.npy", mmap_mode=mmap_mode) for name in meta["columns"]}
@@ -0,0 +1,142 @@
+import argparse
+import json
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from simulation.monte_carlo import EV_BINS, ODDS_BINS
+from utils.atomic import atomic_write
+
+TOTALS = ["count", "win_rate_sum", "hits"]
+
+
+def assign_bins(values, edges):
+    # Same right-closed intervals as pd.cut(values, edges, labels=False); -1 when outside the edges.
+    bins = np.searchsorted(edges, values, side="left") - 1
+    return np.where((bins >= 0) & (bins < len(edges) - 1), bins, -1)
+
+
+class CalibrationStore():
+    # Running totals of predicted win rate against actual hits, per (ev_bin, odds_bin) and per league.
+    def __init__(self, path, load=True) -> None:
+        self.path = Path(path)
+        self.shape = (len(EV_BINS) - 1, len(ODDS_BINS) - 1)
+        self.bins = {total: np.zeros(self.shape) for total in TOTALS}
+        self.leagues = {}
+        if load and self.path.exists():
+            with open(self.path) as f:
+                stored = json.load(f)
+            if stored["ev_bins"] != EV_BINS or stored["odds_bins"] != ODDS_BINS:
+                raise ValueError(f"{self.path} was built with different bin edges, rebuild it from the ledger")
+            self.bins = {total: np.array(stored["bins"][total], dtype=np.float64) for total in TOTALS}
+            self.leagues = stored["leagues"]
+
+    @property
+    def empty(self):
+        return not self.bins["count"].sum()
+
+    def update(self, win_rate, odds, ev, hit, leagues=None):
+        win_rate = np.asarray(win_rate, dtype=np.float64)
+        hit = np.asarray(hit, dtype=np.float64)
+        ev_bin = assign_bins(np.asarray(ev, dtype=np.float64), EV_BINS)
+        odds_bin = assign_bins(np.asarray(odds, dtype=np.float64), ODDS_BINS)
+        binned = (ev_bin >= 0) & (odds_bin >= 0) & ~np.isnan(win_rate)
+
+        where = (ev_bin[binned], odds_bin[binned])
+        np.add.at(self.bins["count"], where, 1)
+        np.add.at(self.bins["win_rate_sum"], where, win_rate[binned])
+        np.add.at(self.bins["hits"], where, hit[binned])
+
+        if leagues is not None:
+            frame = pd.DataFrame({"league": leagues, "count": 1, "win_rate_sum": win_rate, "hits": hit})
+            for league, totals in frame.groupby("league")[TOTALS].sum().iterrows():
+                stored = self.leagues.setdefault(str(league), dict.fromkeys(TOTALS, 0.0))
+                for total in TOTALS:
+                    stored[total] += float(totals[total])
+        return int(binned.sum())
+
+    def bin_table(self):
+        ev_bin, odds_bin = np.indices(self.shape)
+        count = self.bins["count"].ravel()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            table = pd.DataFrame({
+                "ev_bin": ev_bin.ravel(),
+                "odds_bin": odds_bin.ravel(),
+                "count": count.astype(np.int64),
+                "avg_pred_win_rate": self.bins["win_rate_sum"].ravel() / count,
+                "actual_hit_rate": self.bins["hits"].ravel() / count,
+                "weight": count / count.sum(),
+            })
+        return table[table["count"] > 0].reset_index(drop=True)
+
+    def league_table(self):
+        table = pd.DataFrame.from_dict(self.leagues, orient="index", columns=TOTALS).rename_axis("league").reset_index()
+        table["count"] = table["count"].astype(np.int64)
+        table["avg_pred_win_rate"] = table["win_rate_sum"] / table["count"]
+        table["actual_hit_rate"] = table["hits"] / table["count"]
+        return table.drop(columns=["win_rate_sum", "hits"])
+
+    def calibrated_win_rate(self, win_rate, odds, ev, prior_count=50):
+        # Shift each prediction by its bin's observed bias, shrunk towards no shift while the bin is small.
+        win_rate = np.asarray(win_rate, dtype=np.float64)
+        ev_bin = assign_bins(np.asarray(ev, dtype=np.float64), EV_BINS)
+        odds_bin = assign_bins(np.asarray(odds, dtype=np.float64), ODDS_BINS)
+        binned = (ev_bin >= 0) & (odds_bin >= 0)
+
+        count = self.bins["count"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            bias = np.where(count > 0, (self.bins["hits"] - self.bins["win_rate_sum"]) / (count + prior_count), 0.0)
+        shift = np.where(binned, bias[np.where(binned, ev_bin, 0), np.where(binned, odds_bin, 0)], 0.0)
+        return np.clip(win_rate + shift, 0.001, 0.999)
+
+    def calibrated_probs(self, probs, odds):
+        # probs, odds: (n, 3) arrays, one column per side. Each side is shifted by its own bin, so the
+        # shifted rows are renormalised to sum to 1 again.
+        probs = np.asarray(probs, dtype=np.float64)
+        shifted = self.calibrated_win_rate(probs, odds, probs * (np.asarray(odds, dtype=np.float64) - 1) - (1 - probs))
+        return shifted / shifted.sum(axis=1, keepdims=True)
+
+    def save(self):
+        with atomic_write(self.path) as f:
+            json.dump({
+                "ev_bins": EV_BINS,
+                "odds_bins": ODDS_BINS,
+                "bins": {total: values.tolist() for total, values in self.bins.items()},
+                "leagues": self.leagues,
+            }, f, indent=2)
+
+
+def ledger_hits(past_bets):
+    if "outcome" in past_bets:
+        return (past_bets["outcome"] == past_bets["side"]).to_numpy()
+    return past_bets["hit"].astype(str).str.lower().isin(["true", "1", "1.0"]).to_numpy()
+
+def model_rates(bets):
+    # The store measures the model's own predictions: calibrated rates fed back in would have their bias
+    # corrected twice. Bets stored before model_win_rate existed only have win_rate.
+    win_rate = bets["model_win_rate"].astype(np.float64).fillna(bets["win_rate"]) if "model_win_rate" in bets else bets["win_rate"]
+    win_rate = win_rate.to_numpy(dtype=np.float64)
+    odds = bets["odds"].to_numpy(dtype=np.float64)
+    return win_rate, win_rate * (odds - 1) - (1 - win_rate)
+
+def rebuild(past_bets, path):
+    store = CalibrationStore(path, load=False)
+    settled = past_bets[past_bets["outcome"].notna()] if "outcome" in past_bets else past_bets[past_bets["hit"].notna()]
+    win_rate, ev = model_rates(settled)
+    store.update(win_rate, settled["odds"], ev, ledger_hits(settled), settled["league"] if "league" in settled else None)
+    return store
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibration of predicted win rates against settled bets")
+    parser.add_argument("command", choices=["show", "rebuild"])
+    parser.add_argument("--data", default="data/past_bets.csv", help="Settled bets used by rebuild")
+    parser.add_argument("--store", default="data/calibration.json")
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        store = rebuild(pd.read_csv(args.data), args.store)
+        store.save()
+    else:
+        store = CalibrationStore(args.store)
+    print(store.bin_table().to_string(index=False))
+    if store.leagues:
+        print(store.league_table().to_string(index=False))
@@ -0,0 +1,198 @@
+import math
+import numpy as np
+import pandas as pd
+from simulation.monte_carlo import prepare_batch_data, simulate_monte_carlo_batch
+
+# Analytical counterpart of the sampled engine. The bankroll after each 20-bet window is
+# B * (1 + max_risk * r), with r the stake-weighted return of the window, so log(B) is a sum of
+# independent window terms and its distribution can be propagated by convolution.
+#
+# Approximations, kept deliberately small:
+# - the window denominator sum(1 + ev * beta) is replaced by its expectation, which is exact for beta = 0;
+# - the high odds cap is tracked as a Markov state (high odds bets used so far), while the number of
+#   windows is taken from its marginal distribution, independent of the window returns.
+
+
+def _fft_convolve(a, b):
+    size = len(a) + len(b) - 1
+    n = 1 << (size - 1).bit_length()
+    result = np.fft.irfft(np.fft.rfft(a, n) * np.fft.rfft(b, n), n)[:size]
+    return np.clip(result, 0.0, None)
+
+def _discretize(values, probs, step):
+    # Spread each point mass over its two neighbouring grid points so the mean is preserved.
+    scaled = values / step
+    low = np.floor(scaled).astype(np.int64)
+    frac = scaled - low
+    offset = int(low.min()) if len(low) else 0
+    size = int(low.max()) - offset + 2 if len(low) else 1
+    pmf = np.bincount(low - offset, weights=probs * (1 - frac), minlength=size)
+    pmf += np.bincount(low - offset + 1, weights=probs * frac, minlength=size)
+    return pmf, offset
+
+def _bet_kernel(batch_data, rows, sampling_probs, beta, scale, step):
+    probs = sampling_probs[rows]
+    if not probs.sum():
+        return None
+    probs = probs / probs.sum()
+    risk = 1 + batch_data["ev"][rows] * beta
+    win = batch_data["bet_win_rate"][rows]
+    values = np.concatenate([risk * (batch_data["bet_odds"][rows] - 1), -risk]) / scale
+    return _discretize(values, np.concatenate([probs * win, probs * (1 - win)]), step)
+
+def _convolve(first, second):
+    return _fft_convolve(first[0], second[0]), first[1] + second[1]
+
+def _add(total, part):
+    if total is None:
+        return part
+    offset = min(total[1], part[1])
+    size = max(total[1] + len(total[0]), part[1] + len(part[0])) - offset
+    pmf = np.zeros(size)
+    pmf[total[1] - offset:total[1] - offset + len(total[0])] += total[0]
+    pmf[part[1] - offset:part[1] - offset + len(part[0])] += part[0]
+    return pmf, offset
+
+def _scale(part, factor):
+    return part[0] * factor, part[1]
+
+def window_return_distributions(batch_data, beta, window_size=20, high_odds_limit=2, return_step=0.001):
+    sampling_probs = (batch_data["bin_weights"] / batch_data["bin_counts"]).repeat(batch_data["bin_counts"])
+    high = batch_data["bet_odds"] > 6.0
+    high_share = sampling_probs[high].sum()
+
+    mean_risk = (sampling_probs * (1 + batch_data["ev"] * beta)).sum()
+    scale = window_size * mean_risk
+    low_kernel = _bet_kernel(batch_data, np.flatnonzero(~high), sampling_probs, beta, scale, return_step)
+    high_kernel = _bet_kernel(batch_data, np.flatnonzero(high), sampling_probs, beta, scale, return_step)
+    if low_kernel is None:
+        raise ValueError("Convolution engine needs at least one bet with odds <= 6.0")
+
+    # windows[s0][s1]: distribution of r for a window entered with s0 high odds bets used and left with s1.
+    windows = {}
+    for start in range(high_odds_limit + 1):
+        states = {start: (np.ones(1), 0)}
+        for _ in range(window_size):
+            next_states = {}
+            for used, dist in states.items():
+                if used < high_odds_limit and high_kernel is not None:
+                    next_states[used + 1] = _add(next_states.get(used + 1), _scale(_convolve(dist, high_kernel), high_share))
+                    next_states[used] = _add(next_states.get(used), _scale(_convolve(dist, low_kernel), 1 - high_share))
+                else:
+                    next_states[used] = _add(next_states.get(used), _convolve(dist, low_kernel))
+            states = next_states
+        windows[start] = states
+
+    return windows, high_share
+
+def window_count_distribution(num_bets, high_share, window_size=20, high_odds_limit=2):
+    # Draws of high odds bets beyond the cap are skipped, so fewer than num_bets bets are kept.
+    highs = np.arange(num_bets + 1)
+    if high_share <= 0:
+        log_pmf = np.where(highs == 0, 0.0, -np.inf)
+    elif high_share >= 1:
+        log_pmf = np.where(highs == num_bets, 0.0, -np.inf)
+    else:
+        log_pmf = np.array([
+            math.lgamma(num_bets + 1) - math.lgamma(k + 1) - math.lgamma(num_bets - k + 1)
+            + k * math.log(high_share) + (num_bets - k) * math.log1p(-high_share)
+            for k in highs
+        ])
+    kept = num_bets - np.maximum(highs - high_odds_limit, 0)
+    return np.bincount(kept // window_size, weights=np.exp(log_pmf), minlength=num_bets // window_size + 1)
+
+def _growth_kernel(window, max_risk, return_step, log_step):
+    pmf, offset = window
+    returns = (offset + np.arange(len(pmf))) * return_step
+    growth = np.log(np.maximum(1 + max_risk * returns, 1e-6))
+    keep = pmf > 0
+    return _discretize(growth[keep], pmf[keep], log_step)
+
+def bankroll_distribution(batch_data, initial_balance, beta, max_risk, ruin_threshold, num_bets=600, window_size=20, high_odds_limit=2, return_step=0.001, log_step=0.002):
+    windows, high_share = window_return_distributions(batch_data, beta, window_size, high_odds_limit, return_step)
+    window_counts = window_count_distribution(num_bets, high_share, window_size, high_odds_limit)
+    kernels = {
+        (start, end): _growth_kernel(window, max_risk, return_step, log_step)
+        for start, ends in windows.items()
+        for end, window in ends.items()
+    }
+
+    # Fixed log-bankroll grid, in log_step units relative to the initial balance.
+    barrier = math.floor(math.log(ruin_threshold) / log_step) if ruin_threshold > 0 else None
+    lowest = min(offset for _, offset in kernels.values())
+    highest = max(offset + len(pmf) for pmf, offset in kernels.values())
+    total_windows = len(window_counts) - 1
+    grid_low = min(0, barrier + lowest if barrier is not None else total_windows * lowest)
+    grid_high = max(0, total_windows * highest) + 1
+    size = grid_high - grid_low
+
+    alive = {0: np.zeros(size)}
+    alive[0][-grid_low] = 1.0
+    absorbed = np.zeros(size)
+    final = window_counts[0] * alive[0].copy()
+    ruin_by_window = [0.0]
+
+    for step in range(1, total_windows + 1):
+        next_alive = {}
+        for (start, end), (pmf, offset) in kernels.items():
+            if start not in alive:
+                continue
+            moved = _fft_convolve(alive[start], pmf)
+            positions = np.clip(np.arange(len(moved)) + offset, 0, size - 1)
+            shifted = np.bincount(positions, weights=moved, minlength=size)
+            next_alive[end] = next_alive[end] + shifted if end in next_alive else shifted
+
+        # Absorbing barrier: paths at or below ruin_threshold stop betting where they landed.
+        if barrier is not None:
+            cut = barrier - grid_low + 1
+            for state in next_alive.values():
+                absorbed[:cut] += state[:cut]
+                state[:cut] = 0.0
+        alive = next_alive
+        ruin_by_window.append(absorbed.sum())
+
+        final += window_counts[step] * (sum(alive.values()) + absorbed)
+
+    bankroll = initial_balance * np.exp((grid_low + np.arange(size)) * log_step)
+    ruin_probability = float((window_counts * np.array(ruin_by_window)).sum())
+
+    distribution = pd.DataFrame({"final_bankroll": bankroll, "probability": final})
+    distribution = distribution[distribution["probability"] > 1e-15].reset_index(drop=True)
+    distribution["probability"] /= distribution["probability"].sum()
+    return distribution, ruin_probability
+
+def distribution_quantile(distribution, q):
+    cumulative = distribution["probability"].cumsum().to_numpy()
+    position = min(np.searchsorted(cumulative, q, side="left"), len(cumulative) - 1)
+    return float(distribution["final_bankroll"].iloc[position])
+
+def analytical_ruin(past_bets, initial_balance, beta, max_risk, ruin_threshold, ev_treshold=0.1, quantiles=(0.05, 0.5, 0.95), **kwargs):
+    batch_data = prepare_batch_data(past_bets, ev_treshold)
+    distribution, ruin_probability = bankroll_distribution(batch_data, initial_balance, beta, max_risk, ruin_threshold, **kwargs)
+
+    return {
+        "ruin_probability": ruin_probability,
+        "mean_final_bankroll": float((distribution["final_bankroll"] * distribution["probability"]).sum()),
+        "quantiles": {q: distribution_quantile(distribution, q) for q in quantiles},
+        "distribution": distribution,
+    }
+
+def cross_check(past_bets, initial_balance, beta, max_risk, ruin_threshold, ev_treshold=0.1, num_simulations=200000, seed=None, quantiles=(0.05, 0.5, 0.95)):
+    analytical = analytical_ruin(past_bets, initial_balance, beta, max_risk, ruin_threshold, ev_treshold, quantiles)
+    sampled = simulate_monte_carlo_batch(past_bets, num_simulations, initial_balance, beta, max_risk, ruin_threshold, ev_treshold, seed=seed)
+
+    rows = [
+        {"metric": "ruin_probability", "analytical": analytical["ruin_probability"], "sampled": sampled.ruin_probability},
+        {"metric": "mean_final_bankroll", "analytical": analytical["mean_final_bankroll"], "sampled": sampled.mean("final_bankroll")},
+    ]
+    for q in quantiles:
+        rows.append({"metric": f"p{round(q * 100):g}_final_bankroll", "analytical": analytical["quantiles"][q], "sampled": sampled.quantile("final_bankroll", q)})
+
+    report = pd.DataFrame(rows).set_index("metric")
+    report["difference"] = report["analytical"] - report["sampled"]
+    return report
+
+if __name__ == "__main__":
+    past_bets = pd.read_csv("data/old_strat/past_bets.csv")
+
+    print(cross_check(past_bets, initial_balance=100, beta=2, max_risk=0.3, ruin_threshold=0.5, seed=2))
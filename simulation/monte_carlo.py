@@ -1,29 +1,26 @@
+import os
+from functools import partial
+from pathlib import Path
 import pandas as pd
 import numpy as np
 from tqdm import tqdm
+from simulation.aggregate import SimulationAggregator
+from simulation.cache import load_cached_arrays, cache_dir_for
 
 def set_seed(seed):
     np.random.seed(seed)
 
-def simulate_monte_carlo(past_bets, num_simulations, initial_balance, beta, max_risk, ruin_threshold, ev_treshold=0.1):
+def simulate_monte_carlo(past_bets, num_simulations, initial_balance, beta, max_risk, ruin_threshold, ev_treshold=0.1, rng=None):
     results = []
     for _ in tqdm(range(num_simulations), desc="Simulating Monte Carlo", unit="simulation"):
-        result = single_monte_carlo(past_bets, initial_balance, beta, max_risk, ruin_threshold, ev_treshold)
+        result = single_monte_carlo(past_bets, initial_balance, beta, max_risk, ruin_threshold, ev_treshold, rng=rng)
         results.append(result)
     return pd.DataFrame(results)
 
-def single_monte_carlo(past_bets, initial_balance, beta, max_risk, ruin_threshold, ev_treshold):
+def single_monte_carlo(past_bets, initial_balance, beta, max_risk, ruin_threshold, ev_treshold, rng=None):
     data = get_simulation_data(past_bets, threshold=ev_treshold)
     data, bin_counts = bin_data(data)
-    grouped = data.groupby(["ev_bin", "odds_bin"]).agg(
-    avg_pred_win_rate=("bet_win_rate", "mean"),
-    actual_hit_rate=("hit", "mean"),
-    count=("hit", "count")).reset_index()
-
-    # print(grouped.sort_values("count", ascending=False).head(50))
-
-    # exit()
-    sampled_data = sample_data(data, bin_counts, 600)
+    sampled_data = sample_data(data, bin_counts, 600, rng=rng)
 
     window_size = 20
     num_windows = len(sampled_data) // window_size
@@ -42,7 +39,7 @@ def single_monte_carlo(past_bets, initial_balance, beta, max_risk, ruin_threshol
         end = start + window_size
         window = sampled_data.iloc[start:end]
 
-        profit, sim_window = simulate_step(window, initial_balance=bankroll, max_risk=max_risk, beta=beta)
+        profit, sim_window = simulate_step(window, initial_balance=bankroll, max_risk=max_risk, beta=beta, rng=rng)
         returns.append(profit)
         simulated_hits += sim_window["sim_result"].sum()
         total_bets += len(sim_window)
@@ -74,13 +71,14 @@ def single_monte_carlo(past_bets, initial_balance, beta, max_risk, ruin_threshol
         "simulated_hit_rate": simulated_hit_rate,
     }
 
-def simulate_step(window, initial_balance, max_risk, beta):
+def simulate_step(window, initial_balance, max_risk, beta, rng=None):
+    rng = np.random if rng is None else rng
     window = window.copy()
     window["risk"] = 1 + window["ev"] * beta
         
     window["risk"] = (max_risk*initial_balance*window["risk"])/window["risk"].sum()
 
-    window["sim_result"] = np.random.rand(len(window)) < window["bet_win_rate"]
+    window["sim_result"] = rng.random(len(window)) < window["bet_win_rate"]
 
 
     window["payout"] = np.where(
@@ -101,68 +99,273 @@ def simulate_step(window, initial_balance, max_risk, beta):
 
     return total_profit,  window
 
-def get_simulation_data(past_bets, threshold=0.1):
-    data = past_bets.copy().dropna()
-    data["hit"] = (data["bet"] == data["outcome"]).astype(int)
-
-    data["bet_odds"] = data.apply(lambda row: row[f"odds_{row['bet']}"], axis=1)
-    data["bet_win_rate"] = data.apply(lambda row: row[f"{row['bet']}_win_%"], axis=1)
+BET_SIDES = ["home", "draw", "away"]
 
-    data = data[["bet_win_rate", "bet_odds", "ev", "hit"]]
+def get_simulation_data(past_bets, threshold=0.1):
+    side_codes = past_bets["bet"].map({side: code for code, side in enumerate(BET_SIDES)})
+    unknown = side_codes.isna()
+    if unknown.any():
+        sides = sorted(past_bets.loc[unknown, "bet"].astype(str).unique())
+        print(f"[WARN] Dropping {int(unknown.sum())} past bets with unknown side: {sides}")
+
+    data = past_bets[~unknown]
+    rows = np.arange(len(data))
+    codes = side_codes[~unknown].to_numpy(dtype=np.int64)
+
+    # Gather the odds and win rate of the side that was bet on with one fancy index per column block.
+    odds = data[[f"odds_{side}" for side in BET_SIDES]].to_numpy(dtype=np.float64)
+    win_rates = data[[f"{side}_win_%" for side in BET_SIDES]].to_numpy(dtype=np.float64)
+
+    data = pd.DataFrame({
+        "bet_win_rate": win_rates[rows, codes],
+        "bet_odds": odds[rows, codes],
+        "ev": data["ev"].to_numpy(dtype=np.float64),
+        "hit": (data["bet"] == data["outcome"]).to_numpy(dtype=int),
+        "outcome": data["outcome"].to_numpy(),
+    }, index=data.index)
+    data = data.dropna().drop(columns="outcome")
     data = data[data["ev"] > threshold]
 
     return data
 
+EV_BINS = [0, 0.01, 0.03, 0.07, 0.15, 1.0]
+ODDS_BINS = [1.0, 2.5, 4.0, 7.0, 20.0]
+
 def bin_data(data):
-    ev_bins = [0, 0.01, 0.03, 0.07, 0.15, 1.0]
-    odds_bins = [1.0, 2.5, 4.0, 7.0, 20.0]
-    data["ev_bin"] = pd.cut(data["ev"], bins=ev_bins, labels=False)
-    data["odds_bin"] = data.groupby("ev_bin")["bet_odds"].transform(
-    lambda x: pd.cut(x, bins=odds_bins, labels=False))
+    data = data.copy()
+    data["ev_bin"] = pd.cut(data["ev"], bins=EV_BINS, labels=False)
+    data["odds_bin"] = pd.cut(data["bet_odds"], bins=ODDS_BINS, labels=False).where(data["ev_bin"].notna())
+
+    # Rows are stored contiguously per bin so a bin is just an (offset, count) slice of data;
+    # rows outside the bin edges are kept at the end and are never sampled.
+    binned = data["ev_bin"].notna() & data["odds_bin"].notna()
+    data = pd.concat([data[binned].sort_values(["ev_bin", "odds_bin"], kind="stable"), data[~binned]], ignore_index=True)
+
     bin_counts = data.groupby(["ev_bin", "odds_bin"]).size().reset_index(name="count")
+    bin_counts["offset"] = bin_counts["count"].cumsum() - bin_counts["count"]
     bin_counts["weight"] = bin_counts["count"] / bin_counts["count"].sum()
     return data, bin_counts
 
-def sample_data(data, bin_counts, num_samples):
-    sampled_rows = []
+def sample_indices(offsets, counts, weights, size, rng):
+    bins = rng.choice(len(weights), size=size, p=weights)
+    return offsets[bins] + (rng.random(size) * counts[bins]).astype(np.int64)
 
-    bin_choices = bin_counts[["ev_bin", "odds_bin"]].values
-    bin_weights = bin_counts["weight"].values
+def cap_high_odds(odds, high_odds_limit=2):
+    high = odds > 6.0
+    return ~high | (np.cumsum(high, axis=-1) <= high_odds_limit)
 
-    high_odds_limit = 2
-    high_odds_count = 0
+def sample_data(data, bin_counts, num_samples, rng=None, high_odds_limit=2):
+    rng = np.random if rng is None else rng
 
-    for _ in range(num_samples):
-        ev_bin, odds_bin = bin_choices[np.random.choice(len(bin_choices), p=bin_weights)]
+    positions = sample_indices(
+        bin_counts["offset"].to_numpy(),
+        bin_counts["count"].to_numpy(),
+        bin_counts["weight"].to_numpy(),
+        num_samples,
+        rng,
+    )
+    keep = cap_high_odds(data["bet_odds"].to_numpy()[positions], high_odds_limit)
+
+    return data.iloc[positions[keep]]
+
+def batch_arrays(path, threshold):
+    return to_batch_data(*bin_data(get_simulation_data(pd.read_csv(path), threshold=threshold)))
+
+def cached_batch_data(path, threshold=0.1, cache_dir=None):
+    # The batch layout (bin sorted rows, bin offsets, counts and weights) of each ev threshold is cached
+    # as is, so every array handed to the simulator is the read-only mapping of its .npy file.
+    cache_dir = Path(cache_dir) if cache_dir is not None else cache_dir_for(path)
+    return load_cached_arrays(path, partial(batch_arrays, threshold=threshold), cache_dir / f"ev_{threshold}")
+
+def prepare_batch_data(past_bets, ev_treshold=0.1, calibration=None):
+    # past_bets is a DataFrame, or a csv path served from the mmap cache.
+    if isinstance(past_bets, (str, os.PathLike)):
+        batch_data = cached_batch_data(past_bets, ev_treshold)
+        if calibration is not None:
+            # Only the calibrated column becomes a new array; the rest stay mapped.
+            batch_data = {**batch_data, "bet_win_rate": calibration.calibrated_win_rate(batch_data["bet_win_rate"], batch_data["bet_odds"], batch_data["ev"])}
+        return batch_data
+    data = get_simulation_data(past_bets, threshold=ev_treshold)
+    if calibration is not None:
+        data["bet_win_rate"] = calibration.calibrated_win_rate(data["bet_win_rate"], data["bet_odds"], data["ev"])
+    return to_batch_data(*bin_data(data))
 
-        candidates = data[(data["ev_bin"] == ev_bin) & (data["odds_bin"] == odds_bin)]
+def to_batch_data(data, bin_counts):
+    data = data.iloc[:bin_counts["count"].sum()]
 
-        if not candidates.empty:
-            sample = candidates.sample(n=1).iloc[0]
+    return {
+        "bet_odds": data["bet_odds"].to_numpy(dtype=np.float64),
+        "bet_win_rate": data["bet_win_rate"].to_numpy(dtype=np.float64),
+        "ev": data["ev"].to_numpy(dtype=np.float64),
+        "hit": data["hit"].to_numpy(dtype=np.int8),
+        "bin_offsets": bin_counts["offset"].to_numpy(dtype=np.int64),
+        "bin_counts": bin_counts["count"].to_numpy(dtype=np.int64),
+        "bin_weights": bin_counts["weight"].to_numpy(dtype=np.float64),
+    }
+
+def draw_batch(batch_data, num_simulations, rng, num_bets=600, window_size=20, high_odds_limit=2):
+    idx = sample_indices(
+        batch_data["bin_offsets"],
+        batch_data["bin_counts"],
+        batch_data["bin_weights"],
+        (num_simulations, num_bets),
+        rng,
+    )
 
-            if sample["bet_odds"] > 6.0:
-                if high_odds_count >= high_odds_limit:
-                    continue
-                high_odds_count += 1
+    # Draws beyond the high odds cap are skipped, so kept bets shift left like in sample_data.
+    keep = cap_high_odds(batch_data["bet_odds"][idx], high_odds_limit)
+    order = np.argsort(~keep, axis=1, kind="stable")
+    idx = np.take_along_axis(idx, order, axis=1)
+    num_windows = keep.sum(axis=1) // window_size
 
-            sampled_rows.append(sample)
-        else:
-            continue
+    uniforms = rng.random((num_simulations, num_bets))
 
-    sampled_data = pd.DataFrame(sampled_rows)
-    return sampled_data
+    return {
+        "idx": idx,
+        "num_windows": num_windows,
+        "uniforms": uniforms,
+        "window_size": window_size,
+    }
+
+def summarize_windows(batch_data, draws):
+    # Per-window sums that do not depend on beta or max_risk; cached on the draws so that
+    # several strategies can be evaluated against the same sampled bets and outcomes.
+    if "window_payout" in draws:
+        return draws
+
+    window_size = draws["window_size"]
+    idx = draws["idx"]
+    num_sims, num_bets = idx.shape
+    total_windows = num_bets // window_size
+    shape = (num_sims, total_windows, window_size)
+
+    idx = idx[:, :total_windows * window_size].reshape(shape)
+    sim_result = draws["uniforms"][:, :total_windows * window_size].reshape(shape) < batch_data["bet_win_rate"][idx]
+    payout = np.where(sim_result, batch_data["bet_odds"][idx] - 1, -1.0)
+    ev = batch_data["ev"][idx]
+
+    draws["window_payout"] = payout.sum(axis=2)
+    draws["window_ev_payout"] = (ev * payout).sum(axis=2)
+    draws["window_ev"] = ev.sum(axis=2)
+    draws["window_hits"] = sim_result.sum(axis=2)
+    return draws
+
+def evaluate_batch(batch_data, draws, initial_balance, beta, max_risk, ruin_threshold):
+    draws = summarize_windows(batch_data, draws)
+    window_size = draws["window_size"]
+    num_sims, total_windows = draws["window_payout"].shape
+
+    # Stakes are max_risk * bankroll split by 1 + ev * beta, so each window scales the bankroll
+    # by 1 + max_risk * sum(risk * payout) / sum(risk).
+    window_return = (draws["window_payout"] + beta * draws["window_ev_payout"]) / (window_size + beta * draws["window_ev"])
+
+    window_pos = np.arange(total_windows)
+    active = window_pos[None, :] < draws["num_windows"][:, None]
+    growth = np.where(active, 1 + max_risk * window_return, 1.0)
+    bankroll = initial_balance * np.cumprod(growth, axis=1)
+
+    ruin_hits = active & (bankroll <= ruin_threshold * initial_balance)
+    ruined = ruin_hits.any(axis=1)
+    ruin_window = np.where(ruined, ruin_hits.argmax(axis=1), total_windows)
+    alive = active & (window_pos[None, :] <= ruin_window[:, None])
+
+    growth = np.where(alive, growth, 1.0)
+    bankroll = initial_balance * np.cumprod(growth, axis=1)
+    previous = np.concatenate([np.full((num_sims, 1), float(initial_balance)), bankroll[:, :-1]], axis=1)
+    returns = np.where(alive, bankroll - previous, 0.0)
+
+    final_bankroll = bankroll[:, -1] if total_windows else np.full(num_sims, float(initial_balance))
+    peak = np.maximum.accumulate(np.concatenate([previous[:, :1], bankroll], axis=1), axis=1)
+    max_drawdown = (peak[:, 1:] - bankroll).max(axis=1, initial=0.0)
+
+    num_steps = alive.sum(axis=1)
+    steps = np.maximum(num_steps, 1)
+    mean_return = returns.sum(axis=1) / steps
+    volatility = np.sqrt((np.where(alive, returns - mean_return[:, None], 0.0) ** 2).sum(axis=1) / steps)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = np.where(volatility > 0, mean_return / volatility, 0.0)
+
+    simulated_hits = np.where(alive, draws["window_hits"], 0).sum(axis=1)
+    total_bets = num_steps * window_size
+    simulated_hit_rate = np.where(total_bets > 0, simulated_hits / np.maximum(total_bets, 1), 0.0)
+
+    return {
+        "final_bankroll": final_bankroll,
+        "roi": (final_bankroll - initial_balance) / initial_balance,
+        "ruined": ruined,
+        "max_drawdown": max_drawdown,
+        "volatility": volatility,
+        "sharpe_ratio": sharpe,
+        "underwater_time": (alive & (bankroll < initial_balance)).sum(axis=1),
+        "simulated_hit_rate": simulated_hit_rate,
+    }
+
+def simulate_batch(batch_data, num_simulations, initial_balance, beta, max_risk, ruin_threshold, rng, num_bets=600, window_size=20):
+    draws = draw_batch(batch_data, num_simulations, rng, num_bets=num_bets, window_size=window_size)
+    return evaluate_batch(batch_data, draws, initial_balance, beta, max_risk, ruin_threshold)
+
+def split_batches(num_simulations, batch_size, seed=None):
+    # One child seed per batch, so a run is reproducible however the batches are distributed.
+    sizes = [min(batch_size, num_simulations - start) for start in range(0, num_simulations, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    return list(zip(sizes, seeds))
+
+def simulate_monte_carlo_batch(past_bets, num_simulations, initial_balance, beta, max_risk, ruin_threshold, ev_treshold=0.1, batch_size=5000, seed=None, keep_paths=False, calibration=None):
+    batch_data = prepare_batch_data(past_bets, ev_treshold, calibration)
+    aggregator = SimulationAggregator(keep_paths=keep_paths)
+
+    for size, batch_seed in tqdm(split_batches(num_simulations, batch_size, seed), desc="Simulating Monte Carlo", unit="batch"):
+        rng = np.random.default_rng(batch_seed)
+        aggregator.update(simulate_batch(batch_data, size, initial_balance, beta, max_risk, ruin_threshold, rng))
+
+    return aggregator
+
+def simulate_monte_carlo_adaptive(past_bets, initial_balance, beta, max_risk, ruin_threshold, ev_treshold=0.1, roi_tolerance=0.02, ruin_tolerance=0.005, confidence=0.95, batch_size=5000, max_simulations=1000000, seed=None, keep_paths=False):
+    batch_data = prepare_batch_data(past_bets, ev_treshold)
+    aggregator = SimulationAggregator(keep_paths=keep_paths)
+    seed_sequence = np.random.SeedSequence(seed)
+
+    # Batches are spawned one at a time from the same SeedSequence as split_batches, so stopping
+    # after k batches reproduces simulate_monte_carlo_batch with k * batch_size paths.
+    converged = False
+    progress = tqdm(total=max_simulations, desc="Simulating Monte Carlo", unit="simulation")
+    while aggregator.count < max_simulations:
+        size = min(batch_size, max_simulations - aggregator.count)
+        rng = np.random.default_rng(seed_sequence.spawn(1)[0])
+        aggregator.update(simulate_batch(batch_data, size, initial_balance, beta, max_risk, ruin_threshold, rng))
+        progress.update(size)
+
+        roi_low, roi_high = aggregator.confidence_interval("roi", confidence)
+        ruin_low, ruin_high = aggregator.ruin_confidence_interval(confidence)
+        if roi_high - roi_low <= roi_tolerance and ruin_high - ruin_low <= ruin_tolerance:
+            converged = True
+            break
+    progress.close()
+
+    roi_low, roi_high = aggregator.confidence_interval("roi", confidence)
+    ruin_low, ruin_high = aggregator.ruin_confidence_interval(confidence)
+    aggregator.precision = {
+        "num_simulations": aggregator.count,
+        "converged": converged,
+        "confidence": confidence,
+        "roi_ci": (roi_low, roi_high),
+        "roi_ci_width": roi_high - roi_low,
+        "ruin_ci": (ruin_low, ruin_high),
+        "ruin_ci_width": ruin_high - ruin_low,
+    }
+    return aggregator
 
 if __name__ == "__main__":
-    set_seed(2)
-    past_bets = pd.read_csv("data/old_strat/past_bets.csv")
+    past_bets = "data/old_strat/past_bets.csv"
     
-    results = simulate_monte_carlo(past_bets, num_simulations=10000, initial_balance=100, beta=2, max_risk=0.3, ruin_threshold=0.5)
+    results = simulate_monte_carlo_batch(past_bets, num_simulations=10000, initial_balance=100, beta=2, max_risk=0.3, ruin_threshold=0.5, seed=2)
     
     print("Final results:")
-    print("Average ROI:", results["roi"].mean())
-    print("Average max drawdown:", results["max_drawdown"].mean())
-    print("Average volatility:", results["volatility"].mean())
-    print("Average Sharpe ratio:", results["sharpe_ratio"].mean())
-    print("Average time underwater:", results["underwater_time"].mean())
-    print("Percentage of ruined simulations:", results["ruined"].mean() * 100)
-    print("Average final bankroll:", results["final_bankroll"].mean())
\ No newline at end of file
+    print("Average ROI:", results.mean("roi"))
+    print("Average max drawdown:", results.mean("max_drawdown"))
+    print("Average volatility:", results.mean("volatility"))
+    print("Average Sharpe ratio:", results.mean("sharpe_ratio"))
+    print("Average time underwater:", results.mean("underwater_time"))
+    print("Percentage of ruined simulations:", results.ruin_probability * 100)
+    print("Average final bankroll:", results.mean("final_bankroll"))
+    print(results.summary())
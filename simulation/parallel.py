@@ -0,0 +1,55 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+from simulation.monte_carlo import prepare_batch_data, simulate_batch, split_batches
+from simulation.aggregate import SimulationAggregator
+
+_worker_data = None
+
+def _init_worker(batch_data=None, path=None, ev_treshold=None):
+    # A csv path is opened from the mmap cache by each worker, so all processes share the mapped pages;
+    # a DataFrame's prepared arrays are shipped once per worker instead of once per batch.
+    global _worker_data
+    _worker_data = batch_data if path is None else prepare_batch_data(path, ev_treshold)
+
+def _run_batch(args):
+    size, batch_seed, initial_balance, beta, max_risk, ruin_threshold, keep_paths = args
+    rng = np.random.default_rng(batch_seed)
+    aggregator = SimulationAggregator(keep_paths=keep_paths)
+    aggregator.update(simulate_batch(_worker_data, size, initial_balance, beta, max_risk, ruin_threshold, rng))
+    return aggregator
+
+def simulate_monte_carlo_parallel(past_bets, num_simulations, initial_balance, beta, max_risk, ruin_threshold, ev_treshold=0.1, batch_size=5000, seed=None, workers=None, keep_paths=False):
+    if isinstance(past_bets, (str, os.PathLike)):
+        # Built (or validated) once here, so the workers only map the cached files.
+        prepare_batch_data(past_bets, ev_treshold)
+        initargs = (None, os.fspath(past_bets), ev_treshold)
+    else:
+        initargs = (prepare_batch_data(past_bets, ev_treshold),)
+    workers = workers or os.cpu_count() or 1
+    tasks = [
+        (size, batch_seed, initial_balance, beta, max_risk, ruin_threshold, keep_paths)
+        for size, batch_seed in split_batches(num_simulations, batch_size, seed)
+    ]
+
+    # Workers hand back one small aggregator per batch (plus its column arrays when paths are kept);
+    # map keeps batch order so the merged result does not depend on the worker count.
+    aggregator = SimulationAggregator(keep_paths=keep_paths)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+        for partial in tqdm(pool.map(_run_batch, tasks), total=len(tasks), desc="Simulating Monte Carlo", unit="batch"):
+            aggregator.merge(partial)
+
+    return aggregator
+
+if __name__ == "__main__":
+    past_bets = "data/old_strat/past_bets.csv"
+
+    results = simulate_monte_carlo_parallel(past_bets, num_simulations=100000, initial_balance=100, beta=2, max_risk=0.3, ruin_threshold=0.5, seed=2)
+
+    print("Final results:")
+    print("Average ROI:", results.mean("roi"))
+    print("Percentage of ruined simulations:", results.ruin_probability * 100)
+    print("Average final bankroll:", results.mean("final_bankroll"))
+    print(results.summary())
@@ -0,0 +1,82 @@
+import argparse
+import itertools
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+from simulation.monte_carlo import prepare_batch_data, draw_batch, evaluate_batch, split_batches
+from simulation.aggregate import SimulationAggregator
+from utils.config_manager import ConfigManager
+
+
+def sweep(past_bets, betas, max_risks, ev_thresholds, ruin_thresholds, num_simulations=10000, initial_balance=100, batch_size=5000, seed=None):
+    rows = []
+    for ev_threshold in ev_thresholds:
+        # Filtering and binning only depend on the EV threshold, so they are done once per value.
+        batch_data = prepare_batch_data(past_bets, ev_threshold)
+        grid = list(itertools.product(betas, max_risks, ruin_thresholds))
+        aggregators = {params: SimulationAggregator() for params in grid}
+
+        # Every configuration sees the same sampled bets and outcome draws (common random numbers),
+        # so differences between rows come from the strategy and not from sampling noise.
+        for size, batch_seed in tqdm(split_batches(num_simulations, batch_size, seed), desc=f"Sweeping ev>{ev_threshold}", unit="batch"):
+            draws = draw_batch(batch_data, size, np.random.default_rng(batch_seed))
+            for (beta, max_risk, ruin_threshold), aggregator in aggregators.items():
+                aggregator.update(evaluate_batch(batch_data, draws, initial_balance, beta, max_risk, ruin_threshold))
+
+        for (beta, max_risk, ruin_threshold), aggregator in aggregators.items():
+            rows.append({
+                "ev_threshold": ev_threshold,
+                "beta": beta,
+                "max_risk": max_risk,
+                "ruin_threshold": ruin_threshold,
+                "mean_roi": aggregator.mean("roi"),
+                "median_roi": aggregator.quantile("roi", 0.5),
+                "p5_roi": aggregator.quantile("roi", 0.05),
+                "ruin_rate": aggregator.ruin_probability,
+                "mean_max_drawdown": aggregator.mean("max_drawdown"),
+                "p95_max_drawdown": aggregator.quantile("max_drawdown", 0.95),
+                "sharpe_ratio": aggregator.mean("sharpe_ratio"),
+                "final_bankroll": aggregator.mean("final_bankroll"),
+            })
+
+    return rank_sweep(pd.DataFrame(rows))
+
+def rank_sweep(results, by="mean_roi"):
+    ascending = by in ("ruin_rate", "mean_max_drawdown", "p95_max_drawdown")
+    results = results.sort_values([by, "ruin_rate"], ascending=[ascending, True], kind="stable").reset_index(drop=True)
+    results.insert(0, "rank", np.arange(1, len(results) + 1))
+    return results
+
+if __name__ == "__main__":
+    config_mgr = ConfigManager("config.yaml")
+
+    parser = argparse.ArgumentParser(description="Monte Carlo strategy parameter sweep")
+    parser.add_argument("--data", default="data/old_strat/past_bets.csv", help="Past bets csv to bootstrap from")
+    parser.add_argument("--beta", type=float, nargs="+", default=[config_mgr.get_setting("beta", 2)])
+    parser.add_argument("--max-risk", type=float, nargs="+", default=[config_mgr.get_setting("weekly_exposure", 0.1)], help="Share of bankroll staked per window (weekly_exposure)")
+    parser.add_argument("--ev-threshold", type=float, nargs="+", default=[config_mgr.get_setting("ev_threshold", 0.1)])
+    parser.add_argument("--ruin-threshold", type=float, nargs="+", default=[config_mgr.get_setting("ruin_threshold", 0.5)])
+    parser.add_argument("--simulations", type=int, default=10000)
+    parser.add_argument("--initial-bankroll", type=float, default=config_mgr.get_setting("initial_bankroll", 100))
+    parser.add_argument("--seed", type=int, default=2)
+    parser.add_argument("--rank-by", default="mean_roi")
+    parser.add_argument("--output", help="Optional csv path for the ranked table")
+    args = parser.parse_args()
+
+    past_bets = pd.read_csv(args.data)
+    results = sweep(
+        past_bets,
+        betas=args.beta,
+        max_risks=args.max_risk,
+        ev_thresholds=args.ev_threshold,
+        ruin_thresholds=args.ruin_threshold,
+        num_simulations=args.simulations,
+        initial_balance=args.initial_bankroll,
+        seed=args.seed,
+    )
+    results = rank_sweep(results.drop(columns="rank"), by=args.rank_by)
+
+    pd.set_option("display.max_columns", None)
+    print(results.to_string(index=False))
+    if args.output:
+        results.to_csv(args.output, index=False)
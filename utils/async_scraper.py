@@ -0,0 +1,100 @@
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+from utils.readiness import CAPTCHA_FRAME
+from utils.card_parser import OUTER_HTML
+
+
+class CaptchaRequired(Exception):
+    pass
+
+
+class AsyncPageFetcher():
+    # Loads several pages concurrently on one async browser and parses their HTML off the event loop.
+    # Results come back in job order, whatever order the pages finish in.
+    def __init__(self, session_file, concurrency=3, host_delay=1.0, headless=False, readiness=None, card_selector=None) -> None:
+        self.session_file = session_file
+        self.concurrency = concurrency
+        self.host_delay = host_delay
+        self.headless = headless
+        # readiness (utils.readiness.Readiness) supplies the adaptive timeouts and jitter of the sync path.
+        self.readiness = readiness
+        # With card_selector, parse gets the matching cards' outerHTML instead of the whole page.
+        self.card_selector = card_selector
+
+    async def _wait_for_host(self, url):
+        # Politeness: page loads on the same host start at least host_delay seconds apart.
+        loop = asyncio.get_running_loop()
+        host = urlparse(url).netloc
+        async with self._host_locks.setdefault(host, asyncio.Lock()):
+            wait = self._last_start.get(host, float("-inf")) + self.host_delay - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._last_start[host] = loop.time()
+
+    async def _wait_until(self, key, condition):
+        start = time.perf_counter()
+        try:
+            await condition(self.readiness.timeout(key) * 1000)
+        except PlaywrightTimeoutError:
+            self.readiness.record_timeout(key)
+            return
+        self.readiness.record(key, time.perf_counter() - start)
+
+    async def _wait_ready(self, page):
+        if self.readiness is None:
+            try:
+                await page.wait_for_load_state("networkidle", timeout=20000)
+            except PlaywrightTimeoutError:
+                pass
+            return
+        if self.card_selector:
+            selector = f"{self.card_selector}, {CAPTCHA_FRAME}"
+            await self._wait_until("odds", lambda timeout: page.locator(selector).first.wait_for(state="visible", timeout=timeout))
+        await self._wait_until("odds_idle", lambda timeout: page.wait_for_load_state("networkidle", timeout=timeout))
+        jitter = self.readiness.jitter_seconds()
+        if jitter:
+            await asyncio.sleep(jitter)
+
+    async def _fetch(self, context, url, parse, parser_pool):
+        async with self._semaphore:
+            await self._wait_for_host(url)
+            page = await context.new_page()
+            try:
+                await page.goto(url, wait_until="domcontentloaded", timeout=20000)
+                await self._wait_ready(page)
+
+                if await page.query_selector(CAPTCHA_FRAME):
+                    raise CaptchaRequired(f"Captcha on {url}")
+                if self.card_selector:
+                    source = await page.locator(self.card_selector).evaluate_all(OUTER_HTML)
+                else:
+                    source = await page.content()
+            finally:
+                await page.close()
+        return await asyncio.get_running_loop().run_in_executor(parser_pool, parse, source)
+
+    async def _fetch_all(self, jobs):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._host_locks, self._last_start = {}, {}
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=self.headless)
+            try:
+                context = await browser.new_context()
+                if os.path.exists(self.session_file):
+                    with open(self.session_file, 'r') as f:
+                        await context.add_cookies(json.load(f))
+                with ThreadPoolExecutor(max_workers=self.concurrency) as parser_pool:
+                    return await asyncio.gather(*(self._fetch(context, url, parse, parser_pool) for url, parse in jobs))
+            finally:
+                await browser.close()
+
+    def fetch(self, jobs):
+        # jobs: (url, parse(html)) pairs, or (url, parse(card_htmls)) with card_selector. The sync Playwright
+        # API owns the calling thread's event loop, so the async session runs on a thread of its own.
+        with ThreadPoolExecutor(max_workers=1) as runner:
+            return runner.submit(asyncio.run, self._fetch_all(jobs)).result()
@@ -0,0 +1,20 @@
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+
+@contextmanager
+def atomic_write(path, mode="w", **open_kwargs):
+    # Written next to the target and swapped in, so a crash mid-write leaves the old file intact
+    # and readers never see a half written one.
+    path = Path(path)
+    os.makedirs(path.parent, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    try:
+        with open(tmp_path, mode, **open_kwargs) as f:
+            yield f
+    except BaseException:
+        if tmp_path.exists():
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
@@ -1,69 +1,79 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime
-from bs4 import BeautifulSoup
 import time
-import random as rand
-from playwright.sync_api import sync_playwright
 import json
 from pathlib import Path
 import re
+from functools import partial
+from urllib.parse import urlparse
 import sys
 import os
 import yaml
 from utils.config_manager import ConfigManager
+from utils.browser_pool import BrowserPool
+from utils.async_scraper import AsyncPageFetcher, CaptchaRequired
+from utils.card_parser import get_parser, OPTA_CARD, ODDS_CARD, OPTA_CARD_CSS, ODDS_CARD_CSS, OUTER_HTML
+from utils.readiness import Readiness, CAPTCHA_FRAME
+from utils.atomic import atomic_write
+
+OPTA_URL = "https://dataviz.theanalyst.com/opta-football-predictions/"
+TEAM_NAME_CLASS = re.compile(r"eventCardTeamName-0-3-\d+.*")
+PRICE_CLASS = re.compile(r"outcomePriceCommon-0-3-\d+")
 
 
 class BroswerManager():
     def __init__(self, data_dir, config_path) -> None:
         self.session_file = f"{data_dir}/session_cookies.json"
         self.config_mgr = ConfigManager(config_path)
-        self.p = None
-        self.browser = None
-        self.context = None
+        self.snapshot_file = Path(data_dir) / "opta_snapshot.json"
+        self._snapshot = None
+        self.pool = BrowserPool(self.session_file, headless=False)
+        self.parser = get_parser(self.config_mgr.get_setting("html_parser", "lxml"))
+        self.fixture_dir = self.config_mgr.get_setting("page_fixture_dir")
+        self.readiness = Readiness(self.config_mgr)
         self.page = None
         
     def _save_cookies(self, page):
-        cookies = page.context.cookies()
-        with open(self.session_file, 'w') as f:
-            json.dump(cookies, f)
-            
-    def _load_cookies(self, page):
-        if os.path.exists(self.session_file):
-            with open(self.session_file, 'r') as f:
-                cookies = json.load(f)
-            page.context.add_cookies(cookies)
+        self.pool.save_cookies(page)
 
-    def _prepare_page(self, url, odds=False, execute=False):
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=False)
-            context = browser.new_context()
-            page = context.new_page()
+    def _load_page(self, page, url, odds):
+        page.goto(url, wait_until="domcontentloaded", timeout=20000)
 
-            self._load_cookies(page)
+        # Ready once the first card (or a captcha) is on the page and the remaining requests have finished.
+        key = "odds" if odds else "opta"
+        self.readiness.wait(page, f"{ODDS_CARD_CSS if odds else OPTA_CARD_CSS}, {CAPTCHA_FRAME}", key, required=False)
+        self.readiness.settle(page, key + "_idle")
+        self.readiness.pause()
 
-            page.goto(url, wait_until="domcontentloaded", timeout=20000)
-            
-            for i in range(5, 10):
-                time.sleep(rand.uniform(1.5, 2))
-            
-            if page.query_selector("iframe[src*='hcaptcha.com']"):
-                print("\n Captcha detected! Solve it manually in the browser.")
-                input("Press Enter after solving the captcha manually...")
+        if page.query_selector(CAPTCHA_FRAME):
+            print("\n Captcha detected! Solve it manually in the browser.")
+            input("Press Enter after solving the captcha manually...")
 
-                self._save_cookies(page)
-                print("\n Captcha solved and session saved. Continuing...")
-            
-            if execute:
-                return p, browser, context, page
-            soup = BeautifulSoup(page.content(), "html.parser")
-
-            if not odds:
-                match_cards = soup.find_all("div", class_="_match-card_1u4oy_1")
-                return soup, match_cards
-            else:
-                match_cards = soup.find_all("div", class_="selectionPrice-0-3-836")
-                return soup, match_cards
+            self._save_cookies(page)
+            print("\n Captcha solved and session saved. Continuing...")
+
+    def _prepare_page(self, url, odds=False, execute=False):
+        if execute:
+            # The caller keeps this page until close_page hands it back to the pool.
+            page = self.start_page()
+            self._load_page(page, url, odds)
+            return self.pool.p, self.pool.browser, page.context, page
+
+        with self.pool.lease() as page:
+            self._load_page(page, url, odds)
+            # Only the cards' markup is taken from the browser and parsed, never the whole page.
+            card_htmls = page.locator(ODDS_CARD_CSS if odds else OPTA_CARD_CSS).evaluate_all(OUTER_HTML)
+            if self.fixture_dir:
+                self._save_fixture(url, page.content(), odds)
+        return self.parser.fragments(card_htmls, ODDS_CARD if odds else OPTA_CARD)
+
+    def _save_fixture(self, url, page_html, odds):
+        # Saved pages feed the parser benchmark (python -m utils.card_parser).
+        os.makedirs(self.fixture_dir, exist_ok=True)
+        slug = re.sub(r"\W+", "_", urlparse(url).path).strip("_")[-60:]
+        with open(Path(self.fixture_dir) / f"{'odds' if odds else 'opta'}_{slug}.html", "w", encoding="utf-8") as f:
+            f.write(f"<!-- fetched_at: {datetime.now().isoformat(timespec='seconds')} -->\n{page_html}")
         
     def _parse_match_date(self, meta_div):
         date_time_divs = meta_div.find_all("div", class_="_match-card-right-label_1u4oy_83")
@@ -170,16 +180,16 @@ class BroswerManager():
                 "outcome": outcome
             }
     def _parse_match_odds(self, match):
-        team_name_a = match.find("div", class_=re.compile(r"eventCardTeamName-0-3-\d+.*"), 
+        team_name_a = match.find("div", class_=TEAM_NAME_CLASS, 
                              attrs={"data-testid": "event-card-team-name-a"})
         home_team = team_name_a.text.strip() if team_name_a else "Unknown"
 
-        team_name_b = match.find("div", class_=re.compile(r"eventCardTeamName-0-3-\d+.*"), 
+        team_name_b = match.find("div", class_=TEAM_NAME_CLASS, 
                                 attrs={"data-testid": "event-card-team-name-b"})
         away_team = team_name_b.text.strip() if team_name_b else "Unknown"
 
         # Extract odds
-        odds = match.find_all("span", class_=re.compile(r"outcomePriceCommon-0-3-\d+"))
+        odds = match.find_all("span", class_=PRICE_CLASS)
         #print(odds)
         try:
             win_odds = float(odds[0].text.strip().replace(",", "."))
@@ -207,84 +217,122 @@ class BroswerManager():
             "loss_odds": loss_odds,
         }
         
-    def get_future_matches(self):
-        _, match_cards = self._prepare_page(
-            "https://dataviz.theanalyst.com/opta-football-predictions/"
-        )
-        future_matches = []
+    def _parse_opta_card(self, match, fetched_at):
+        meta_div = match.find("div", class_="_match-card-meta_1u4oy_18")
+        if not meta_div:
+            return None
 
-        for match in match_cards:
-            meta_div = match.find("div", class_="_match-card-meta_1u4oy_18")
-            if not meta_div:
-                continue
+        match_date = self._parse_match_date(meta_div)
+        if not match_date:
+            return None
+        
+        league_div = meta_div.find("div", class_="_match-card-right-label_1u4oy_83")
+        league_name = league_div.text.strip() if league_div else "Unknown"
 
-            match_date = self._parse_match_date(meta_div)
-            if not match_date or datetime.fromisoformat(match_date) < datetime.now():
-                continue
-            
-            league_div = meta_div.find("div", class_="_match-card-right-label_1u4oy_83")
-            league_name = league_div.text.strip() if league_div else "Unknown"
+        tbody = match.find("tbody")
+        if not tbody:
+            return None
 
-            tbody = match.find("tbody")
-            if not tbody:
-                continue
+        # Upcoming cards carry probabilities and played ones a score, so each parser only sees its own kind.
+        kickoff = datetime.fromisoformat(match_date)
+        return {
+            "date": match_date,
+            "league": league_name,
+            "probs": self._parse_match_probs(tbody) if kickoff >= fetched_at else None,
+            "result": self._parse_card_result(tbody) if kickoff <= fetched_at else None,
+        }
 
-            prob_data = self._parse_match_probs(tbody)
-            #print(prob_data)
-            if not prob_data:
-                continue
+    def _parse_card_result(self, tbody):
+        # A match that kicked off but shows no score yet still has its probability table.
+        try:
+            return self._parse_match_results(tbody)
+        except (ValueError, IndexError):
+            return None
 
-            future_matches.append({
-                "date": match_date,
-                **prob_data
-            })
+    def _load_opta_snapshot(self, ttl):
+        if not self.config_mgr.get_setting("opta_snapshot_disk", False) or not self.snapshot_file.exists():
+            return None
+        with open(self.snapshot_file) as f:
+            snapshot = json.load(f)
+        if time.time() - snapshot["fetched_at"] > ttl:
+            return None
+        return snapshot
+
+    def _parse_opta_cards(self, match_cards, fetched_at):
+        cards = (self._parse_opta_card(match, fetched_at) for match in match_cards)
+        return [card for card in cards if card]
+
+    def get_opta_snapshot(self):
+        # One fetch and parse of the Opta predictions page per ttl, shared by resolution and bet generation.
+        ttl = self.config_mgr.get_setting("opta_snapshot_ttl", 900)
+        if self._snapshot is not None and time.time() - self._snapshot["fetched_at"] <= ttl:
+            return self._snapshot["matches"]
+
+        snapshot = self._load_opta_snapshot(ttl)
+        if snapshot is None:
+            fetched_at = time.time()
+            match_cards = self._prepare_page(OPTA_URL)
+            snapshot = {"fetched_at": fetched_at, "matches": self._parse_opta_cards(match_cards, datetime.fromtimestamp(fetched_at))}
+            if self.config_mgr.get_setting("opta_snapshot_disk", False):
+                with atomic_write(self.snapshot_file) as f:
+                    json.dump(snapshot, f)
+        self._snapshot = snapshot
+        return snapshot["matches"]
 
-        return future_matches
+    def get_future_matches(self):
+        now = datetime.now()
+        return [
+            {"date": match["date"], "league": match["league"], **match["probs"]}
+            for match in self.get_opta_snapshot()
+            if match["probs"] and datetime.fromisoformat(match["date"]) >= now
+        ]
     
     def get_past_matches(self):
-        _, match_cards = self._prepare_page("https://dataviz.theanalyst.com/opta-football-predictions/")
-        past_matches = []
+        now = datetime.now()
+        return [
+            {"date": match["date"], "league": match["league"], **match["result"]}
+            for match in self.get_opta_snapshot()
+            if match["result"] and datetime.fromisoformat(match["date"]) <= now
+        ]
+    
+    def _extract_odds(self, match_cards, league_name):
+        extracted_matches = []
         for match in match_cards:
-            meta_div = match.find("div", class_="_match-card-meta_1u4oy_18")
-            if not meta_div:
-                continue
-
-            match_date = self._parse_match_date(meta_div)
-            if not match_date or datetime.fromisoformat(match_date) > datetime.now():
-                continue
-            
-            league_div = meta_div.find("div", class_="_match-card-right-label_1u4oy_83")
-            league_name = league_div.text.strip() if league_div else "Unknown"
-
-            tbody = match.find("tbody")
-            if not tbody:
-                continue
+            odds_info = self._parse_match_odds(match)
+            if odds_info:
+                odds_info["league"] = league_name
+                extracted_matches.append(odds_info)
+        return extracted_matches
 
-            prob_data = self._parse_match_results(tbody)
-            if not prob_data:
-                continue
+    def _parse_odds_cards(self, card_htmls, league_name):
+        return self._extract_odds(self.parser.fragments(card_htmls, ODDS_CARD), league_name)
+
+    def _get_odds_async(self, leagues):
+        fetcher = AsyncPageFetcher(
+            self.session_file,
+            concurrency=self.config_mgr.get_setting("odds_concurrency", 3),
+            host_delay=self.config_mgr.get_setting("odds_host_delay", 1.0),
+            headless=False,
+            readiness=self.readiness,
+            card_selector=ODDS_CARD_CSS,
+        )
+        pages = fetcher.fetch([(url, partial(self._parse_odds_cards, league_name=prefix)) for prefix, url in leagues.items()])
+        return [odds_info for league_odds in pages for odds_info in league_odds]
 
-            past_matches.append({
-                "date": match_date,
-                **prob_data
-            })
-    
-        return past_matches
-    
     def get_odds(self):
         leagues = self.config_mgr.get_leagues()
         # print(leagues)
+        if self.config_mgr.get_setting("odds_scraping", "sequential") == "async":
+            try:
+                return self._get_odds_async(leagues)
+            except CaptchaRequired as e:
+                # Captchas need a visible page and a person, which only the sequential path offers.
+                print(f"[WARN] {e}, falling back to sequential odds scraping")
+
         extracted_matches = []
         for prefix, url in leagues.items():
-            soup, _ = self._prepare_page(url, odds=True)
-            match_cards = soup.find_all("div", class_=re.compile(r"eventListItemContent-0-3-\d+"))
-
-            for match in match_cards:
-                odds_info = self._parse_match_odds(match)
-                if odds_info:
-                    league_name = prefix
-                    odds_info["league"] = league_name
-                    extracted_matches.append(odds_info)
+            match_cards = self._prepare_page(url, odds=True)
+            extracted_matches.extend(self._extract_odds(match_cards, prefix))
         return extracted_matches
     
     def _login(self, page, username, password):
@@ -299,22 +347,24 @@ class BroswerManager():
         
         page.wait_for_load_state("domcontentloaded", timeout=20000)
 
-        for i in range(5, 10):
-            time.sleep(rand.uniform(1.5, 2))
+        # Logged in once the form is gone; a form that stays up (wrong password, captcha) is left to the caller.
+        self.readiness.wait(page, "input[name='password']", "login", state="hidden", required=False)
+        self.readiness.pause()
     
     def start_page(self):
-        self.p = sync_playwright().start()
-        self.browser = self.p.chromium.launch(headless=False)
-        self.context = self.browser.new_context()
-        self.page = self.context.new_page()
-        self._load_cookies(self.page)
+        self.page = self.pool.acquire()
         return self.page
 
     def close_page(self):
-        if self.browser:
-            self.browser.close()
-        if self.p:
-            self.p.stop()
+        if self.page is not None:
+            self.pool.release(self.page)
+            self.page = None
+
+    def close(self):
+        self.close_page()
+        report = {**self.pool.report(), "readiness": self.readiness.report()}
+        self.pool.close()
+        return report
     
     
     
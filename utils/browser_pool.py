@@ -0,0 +1,105 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+from playwright.sync_api import sync_playwright
+
+
+class BrowserPool():
+    # One Chromium per run; scraping and placement lease a context from it instead of launching their own.
+    def __init__(self, session_file, headless=False, warm_contexts=1) -> None:
+        self.session_file = session_file
+        self.headless = headless
+        self.warm_contexts = warm_contexts
+        self.p = None
+        self.browser = None
+        self._idle = []
+        self._leased = {}
+        self.timings = {"cold_start": None, "context_created": [], "warm_leases": [], "cold_leases": []}
+
+    def _cookies(self):
+        if os.path.exists(self.session_file):
+            with open(self.session_file, 'r') as f:
+                return json.load(f)
+        return []
+
+    def _new_context(self):
+        start = time.perf_counter()
+        context = self.browser.new_context()
+        cookies = self._cookies()
+        if cookies:
+            context.add_cookies(cookies)
+        context.new_page()
+        self.timings["context_created"].append(time.perf_counter() - start)
+        return context
+
+    def start(self):
+        if self.browser is not None:
+            return
+        start = time.perf_counter()
+        self.p = sync_playwright().start()
+        self.browser = self.p.chromium.launch(headless=self.headless)
+        self._idle = [self._new_context() for _ in range(self.warm_contexts)]
+        self.timings["cold_start"] = time.perf_counter() - start
+
+    def acquire(self):
+        start = time.perf_counter()
+        cold = self.browser is None or not self._idle
+        self.start()
+        context = self._idle.pop() if self._idle else self._new_context()
+        page = context.pages[0] if context.pages else context.new_page()
+        self._leased[id(page)] = context
+        self.timings["cold_leases" if cold else "warm_leases"].append(time.perf_counter() - start)
+        return page
+
+    def release(self, page, reuse=True):
+        context = self._leased.pop(id(page), None)
+        if context is None:
+            return
+        # Only a context whose page is still usable goes back to the pool; extra tabs are dropped.
+        if reuse and not page.is_closed():
+            for extra in context.pages[1:]:
+                extra.close()
+            self._idle.append(context)
+        else:
+            context.close()
+
+    @contextmanager
+    def lease(self):
+        page = self.acquire()
+        try:
+            yield page
+        except Exception:
+            self.release(page, reuse=False)
+            raise
+        self.release(page)
+
+    def save_cookies(self, page):
+        cookies = page.context.cookies()
+        with open(self.session_file, 'w') as f:
+            json.dump(cookies, f)
+        # Warm contexts were created before this session was saved, so they get it too.
+        for context in self._idle:
+            context.add_cookies(cookies)
+
+    def report(self):
+        def mean(values):
+            return sum(values) / len(values) if values else None
+        return {
+            "cold_start": self.timings["cold_start"],
+            "contexts_created": len(self.timings["context_created"]),
+            "warm_leases": len(self.timings["warm_leases"]),
+            "mean_warm_lease": mean(self.timings["warm_leases"]),
+            "cold_leases": len(self.timings["cold_leases"]),
+            "mean_cold_lease": mean(self.timings["cold_leases"]),
+        }
+
+    def close(self):
+        for context in self._idle + list(self._leased.values()):
+            context.close()
+        self._idle, self._leased = [], {}
+        if self.browser:
+            self.browser.close()
+        if self.p:
+            self.p.stop()
+        self.browser, self.p = None, None
@@ -0,0 +1,219 @@
+import argparse
+import json
+import re
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    from lxml import etree, html as lxml_html
+except ImportError:
+    lxml_html = None
+
+# (tag, class) of the cards each page is parsed into; the class is a plain token or a compiled regex,
+# matched the way BeautifulSoup's class_ argument matches.
+OPTA_CARD = ("div", "_match-card_1u4oy_1")
+ODDS_CARD = ("div", re.compile(r"eventListItemContent-0-3-\d+"))
+# CSS equivalents, used in the browser to wait for the first card and to take the cards' markup.
+OPTA_CARD_CSS = "div._match-card_1u4oy_1"
+ODDS_CARD_CSS = "div[class*='eventListItemContent-0-3-']"
+# Passed to locator.evaluate_all: only the cards' own markup leaves the browser, not the whole page.
+OUTER_HTML = "cards => cards.map(card => card.outerHTML)"
+# First line of a page saved to page_fixture_dir.
+FETCHED_AT = re.compile(r"<!-- fetched_at: (\S+) -->")
+
+
+class Bs4Parser():
+    name = "bs4"
+
+    def cards(self, page_html, card):
+        tag, class_ = card
+        return BeautifulSoup(page_html, "html.parser").find_all(tag, class_=class_)
+
+    def fragments(self, card_htmls, card):
+        # card_htmls are the cards' outerHTML, so the cards are the top level elements.
+        tag, class_ = card
+        return BeautifulSoup("".join(card_htmls), "html.parser").find_all(tag, class_=class_, recursive=False)
+
+
+class StrainedBs4Parser(Bs4Parser):
+    # Only the card subtrees are built; everything else on the page is skipped by the tokenizer.
+    name = "bs4-strained"
+
+    def __init__(self) -> None:
+        self._strainers = {}
+
+    def _strainer(self, card):
+        tag, class_ = card
+        if isinstance(class_, str):
+            # SoupStrainer compares a plain class with the whole attribute value, so an element with
+            # a second class would be skipped; match one token of it like find_all does.
+            token = class_
+            class_ = lambda value: value is not None and (token in value.split() or value == token)
+        return SoupStrainer(tag, class_=class_)
+
+    def cards(self, page_html, card):
+        tag, class_ = card
+        if card not in self._strainers:
+            self._strainers[card] = self._strainer(card)
+        return BeautifulSoup(page_html, "html.parser", parse_only=self._strainers[card]).find_all(tag, class_=class_)
+
+
+def _class_matches(element, class_):
+    classes = (element.get("class") or "").split()
+    if isinstance(class_, str):
+        return class_ in classes or class_ == " ".join(classes)
+    return any(class_.search(c) for c in classes) or bool(class_.search(" ".join(classes)))
+
+
+class LxmlNode():
+    # The small part of the BeautifulSoup Tag API the card parsers use (find, find_all, text),
+    # backed by lxml elements and XPath expressions compiled once per (tag, class).
+    __slots__ = ("element", "parser")
+
+    def __init__(self, element, parser) -> None:
+        self.element = element
+        self.parser = parser
+
+    @property
+    def text(self):
+        return self.element.text_content()
+
+    def get(self, key, default=None):
+        return self.element.get(key, default)
+
+    def find_all(self, name, class_=None, attrs=None):
+        found = self.parser.select(self.element, name, class_)
+        if attrs:
+            found = [element for element in found if all(element.get(key) == value for key, value in attrs.items())]
+        return [LxmlNode(element, self.parser) for element in found]
+
+    def find(self, name, class_=None, attrs=None):
+        found = self.find_all(name, class_, attrs)
+        return found[0] if found else None
+
+
+class LxmlParser():
+    name = "lxml"
+
+    def __init__(self) -> None:
+        # Compiled XPath objects are not shared between threads (odds pages are parsed on a pool).
+        self._local = threading.local()
+
+    def _xpath(self, name, class_):
+        key = (name, class_)
+        if not hasattr(self._local, "xpaths"):
+            self._local.xpaths = {}
+        if key not in self._local.xpaths:
+            if isinstance(class_, str):
+                expression = f".//{name}[contains(concat(' ', normalize-space(@class), ' '), ' {class_} ')]"
+            elif class_ is not None:
+                expression = f".//{name}[@class]"
+            else:
+                expression = f".//{name}"
+            self._local.xpaths[key] = etree.XPath(expression)
+        return self._local.xpaths[key]
+
+    def select(self, element, name, class_=None):
+        found = self._xpath(name, class_)(element)
+        if class_ is not None and not isinstance(class_, str):
+            found = [e for e in found if _class_matches(e, class_)]
+        return found
+
+    def cards(self, page_html, card):
+        tag, class_ = card
+        if not page_html.strip():
+            return []
+        root = lxml_html.fromstring(page_html)
+        return [LxmlNode(element, self) for element in self.select(root, tag, class_)]
+
+    def fragments(self, card_htmls, card):
+        tag, class_ = card
+        if not card_htmls:
+            return []
+        roots = lxml_html.fragments_fromstring("".join(card_htmls))
+        return [
+            LxmlNode(element, self) for element in roots
+            if not isinstance(element, str) and element.tag == tag and _class_matches(element, class_)
+        ]
+
+
+PARSERS = {"bs4": Bs4Parser, "bs4-strained": StrainedBs4Parser, "lxml": LxmlParser}
+
+def get_parser(name="lxml"):
+    if name == "lxml" and lxml_html is None:
+        print("[WARN] lxml is not installed, parsing pages with BeautifulSoup")
+        name = "bs4"
+    if name not in PARSERS:
+        raise ValueError(f"Unknown html parser {name!r}, expected one of {sorted(PARSERS)}")
+    return PARSERS[name]()
+
+
+def fixture_time(page_html, path):
+    # Card dates carry no year and are read as this year, so the fetch time is moved to this year too.
+    found = FETCHED_AT.search(page_html[:200])
+    fetched_at = datetime.fromisoformat(found.group(1)) if found else datetime.fromtimestamp(path.stat().st_mtime)
+    return fetched_at.replace(year=datetime.now().year)
+
+def benchmark(fixture_dir, browser_mgr, parsers=("bs4", "bs4-strained", "lxml"), repeat=5):
+    # Fixtures are saved pages named opta*.html (predictions) or odds*.html (a league's odds page).
+    # Each backend parses the whole page ("page") and only the cards' outerHTML ("cards"), which is
+    # what a live run takes from the browser; every output is checked against parsers[0] on the page.
+    fixtures = sorted(Path(fixture_dir).glob("*.html"))
+    if not fixtures:
+        raise FileNotFoundError(f"No page fixtures in {fixture_dir}; set page_fixture_dir in config.yaml to save pages during a run")
+    results = []
+    for path in fixtures:
+        page_html = path.read_text(encoding="utf-8")
+        kind = "opta" if path.name.startswith("opta") else "odds"
+        card = OPTA_CARD if kind == "opta" else ODDS_CARD
+        card_htmls = [str(match) for match in Bs4Parser().cards(page_html, card)]
+        fetched_at = fixture_time(page_html, path)
+        outputs = {}
+        for name in parsers:
+            parser = get_parser(name)
+            for mode, source, parse_cards in (("page", page_html, parser.cards), ("cards", card_htmls, parser.fragments)):
+                timings = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    match_cards = parse_cards(source, card)
+                    if kind == "opta":
+                        output = browser_mgr._parse_opta_cards(match_cards, fetched_at)
+                    else:
+                        output = browser_mgr._extract_odds(match_cards, path.stem)
+                    timings.append(time.perf_counter() - start)
+                outputs[(name, mode)] = output
+                results.append({
+                    "fixture": path.name,
+                    "parser": name,
+                    "mode": mode,
+                    "bytes": len(page_html) if mode == "page" else sum(len(html) for html in card_htmls),
+                    "records": len(output),
+                    "best_seconds": min(timings),
+                    "mean_seconds": sum(timings) / len(timings),
+                })
+        baseline = outputs[(parsers[0], "page")]
+        for result in results[-2 * len(parsers):]:
+            result["matches_" + parsers[0]] = outputs[(result["parser"], result["mode"])] == baseline
+    return results
+
+if __name__ == "__main__":
+    from utils.browser_manager import BroswerManager
+
+    parser = argparse.ArgumentParser(description="Benchmark the html parser backends on saved pages")
+    parser.add_argument("fixture_dir", nargs="?", default="data/page_fixtures")
+    parser.add_argument("--parsers", nargs="+", default=["bs4", "bs4-strained", "lxml"], choices=sorted(PARSERS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Optional JSON report path")
+    args = parser.parse_args()
+
+    browser_mgr = BroswerManager(Path(args.fixture_dir).parent, "config.yaml")
+    results = benchmark(args.fixture_dir, browser_mgr, args.parsers, args.repeat)
+    for result in results:
+        match = "" if result["matches_" + args.parsers[0]] else "  OUTPUT DIFFERS"
+        print(f"{result['fixture']:<26} {result['parser']:<14} {result['mode']:<6} {result['records']:>5} records  best {result['best_seconds'] * 1000:8.2f} ms  mean {result['mean_seconds'] * 1000:8.2f} ms{match}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -1,10 +1,15 @@
 import pandas as pd
 import numpy as np
-from datetime import datetime
 from pathlib import Path
 from utils.browser_manager import BroswerManager
 from utils.config_manager import ConfigManager
-from engine import models
+from utils.matcher import FixtureMatcher
+from utils.ledger_store import LedgerStore
+from utils.session_logger import SessionLogger
+from utils.atomic import atomic_write
+from simulation.calibration import CalibrationStore, model_rates, rebuild
+from engine import models, scoring, kelly
+from engine.ledger import BetLedger, PENDING, PLACED, FAILED, RESOLVED, STATUS_TABLES, TABLE_COLUMNS
 from thefuzz import process
 import os
 
@@ -12,74 +17,101 @@ import os
 class DataLoader:
     def __init__(self, data_dir, config_path) -> None: 
         self.data_dir = data_dir
-        self.past_bets = pd.read_csv(f"{data_dir}/past_bets.csv")
+        self.config_mgr = ConfigManager(config_path)
+        self.store = LedgerStore(Path(data_dir) / "ledger.sqlite") if self.config_mgr.get_setting("ledger_backend", "csv") == "sqlite" else None
+        self.ledger = BetLedger()
+        for status, table in STATUS_TABLES.items():
+            self.ledger.extend(self._load_table(table), status, saved=True)
+        self.calibration = self._load_calibration()
         self.pending_bets = None
-        self.placed_bets = pd.read_csv(f"{data_dir}/placed_bets.csv")
-        self.failed_bets = pd.read_csv(f"{data_dir}/failed_bets.csv")
         self.session_file = f"{data_dir}/session_cookies.json"
         self.browser_mgr = BroswerManager(data_dir, config_path)
-        self.config_mgr = ConfigManager(config_path)
-        self.new_placed_bets = []
-        logs_path = self.data_dir / "logs"
-        os.makedirs(logs_path, exist_ok=True)
-        self.log_file = logs_path / f"session_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.txt"
-        with open(self.log_file, 'w') as f:
-            f.write("Session log started.\n")
+        self.matcher = FixtureMatcher(
+            Path(data_dir) / "match_cache.json",
+            confirm_score=self.config_mgr.get_setting("match_confirm_score", 95),
+            max_age_days=self.config_mgr.get_setting("match_cache_max_age_days", 60),
+        )
+        self.logger = SessionLogger(Path(data_dir) / "logs", retention=self.config_mgr.get_setting("log_retention"))
+        self.log_file = self.logger.path
+
+    @property
+    def past_bets(self):
+        return self.ledger.table("past_bets")
+
+    @property
+    def placed_bets(self):
+        return self.ledger.table("placed_bets")
+
+    @property
+    def failed_bets(self):
+        return self.ledger.table("failed_bets")
+
+    def _load_table(self, table):
+        if self.store is None:
+            return pd.read_csv(f"{self.data_dir}/{table}.csv")
+        # Rows keep their store id as index so the ledger can delete exactly those rows once they move.
+        return self.store.read(table)
+
+    def _load_calibration(self):
+        path = Path(self.data_dir) / "calibration.json"
+        if path.exists() or not self.ledger.count(RESOLVED):
+            return CalibrationStore(path)
+        # First run with an existing history: seed the running totals from it once.
+        return rebuild(self.past_bets, path)
+
+    def _write_csv(self, frame, table):
+        with atomic_write(Path(self.data_dir) / f"{table}.csv", newline="") as f:
+            frame.to_csv(f, index=False)
 
     def _get_best_match(self, name, choices, threshold=70):
         best_match, score = process.extractOne(name, choices)
         return best_match if score >= threshold else None
     
+    def _index_past_matches(self, past_matches):
+        # (date, team) -> position of the first match that team played on that date,
+        # so the first match in past_matches still wins like in a linear scan.
+        index = {}
+        for i, match in enumerate(past_matches):
+            index.setdefault((match["date"], match["home_team"]), i)
+            index.setdefault((match["date"], match["away_team"]), i)
+        return pd.DataFrame(
+            [(date, team, i) for (date, team), i in index.items()],
+            columns=["timestamp", "canonical_team", "match_pos"],
+        )
+
     def resolve_past_bets(self):
         past_matches = self.browser_mgr.get_past_matches()
-        rows_to_add = []
-        rows_to_remove = []
-        for i, row in self.placed_bets.iterrows():
-            bet = models.Bet(
-                match_id=row["match_id"],
-                team=row["team"],
-                side = row["side"],
-                odds=row["odds"],
-                win_rate=row["win_rate"],
-                ev=row["ev"],
-                risk=row["risk"],
-                strategy=row["strategy"],
-                placed=row["placed"],
-                timestamp=row["timestamp"],
-                hit=row["hit"],
-                payout=row["payout"],
-                profit=row["profit"]
-            )
-            for match in past_matches:
-                if bet.timestamp == match["date"] and (self.config_mgr.get_reverse_translation(bet.team) == match["home_team"] or self.config_mgr.get_reverse_translation(bet.team) == match["away_team"]):
-                    bet.hit = True if match["outcome"] == bet.side else False
-                    bet.outcome = match["outcome"]
-                    bet.payout = bet.risk * bet.odds if bet.hit else -bet.risk
-                    bet.profit = bet.risk * (bet.odds - 1) if bet.hit else -bet.risk 
-                    rows_to_remove.append(i)
-                    rows_to_add.append({
-                        "match_id": bet.match_id,
-                        "team": bet.team,
-                        "side": bet.side,
-                        "odds": bet.odds,
-                        "win_rate": bet.win_rate,
-                        "ev": bet.ev,
-                        "risk": bet.risk,
-                        "strategy": bet.strategy,
-                        "placed": bet.placed,
-                        "timestamp": bet.timestamp,
-                        "outcome": bet.outcome,
-                        "hit": bet.hit,
-                        "payout": bet.payout,
-                        "profit": bet.profit
-                    })
-                    break
-        self.placed_bets.drop(rows_to_remove, inplace=True)
-        new_bets = pd.DataFrame(rows_to_add)
-        self.past_bets = pd.concat([self.past_bets, new_bets], ignore_index=True)   
-        # print(self.placed_bets)
-        # print(self.past_bets
-        self.add_to_log(f"Resolved {len(rows_to_add)} past bets.")
+        if not past_matches or not self.ledger.count(PLACED):
+            self.add_to_log("Resolved 0 past bets.", event="resolve", resolved=0)
+            return
+
+        # Indexed by ledger row, so the matched rows can be resolved in place.
+        placed = self.ledger.to_frame(PLACED, ["team", "side", "odds", "win_rate", "model_win_rate", "ev", "risk", "timestamp"])
+        translations = {team: self.config_mgr.get_reverse_translation(team) for team in placed["team"].dropna().unique()}
+        keys = placed[["timestamp"]].assign(canonical_team=placed["team"].map(translations)).astype(str)
+
+        match_pos = keys.merge(self._index_past_matches(past_matches), on=["timestamp", "canonical_team"], how="left")["match_pos"]
+        matched = match_pos.notna().to_numpy()
+        resolved = placed[matched]
+
+        positions = match_pos[matched].astype(int).to_numpy()
+        outcome = np.array([match["outcome"] for match in past_matches], dtype=object)[positions]
+        leagues = np.array([match.get("league") for match in past_matches], dtype=object)[positions]
+        hit = outcome == resolved["side"].to_numpy()
+        risk = resolved["risk"].to_numpy()
+        odds = resolved["odds"].to_numpy()
+
+        self.ledger.resolve(
+            resolved.index.to_numpy(),
+            outcome=outcome,
+            hit=hit,
+            payout=np.where(hit, risk * odds, -risk),
+            profit=np.where(hit, risk * (odds - 1), -risk),
+            league=leagues,
+        )
+        model_win_rate, model_ev = model_rates(resolved)
+        self.calibration.update(model_win_rate, odds, model_ev, hit, leagues)
+        self.add_to_log(f"Resolved {len(resolved)} past bets.", event="resolve", resolved=len(resolved), unmatched=int((~matched).sum()))
 
     def get_new_bets(self):
         future_matches = self.browser_mgr.get_future_matches()
@@ -102,127 +134,115 @@ class DataLoader:
             for o in odds_data
         }
         
-        bets = []
+        self.matcher.index_odds(odds_lookup)
+        self.matcher.reset_stats()
         
+        # Join every fixture to its odds once, then score all of them as arrays.
+        fixtures, probs, prices = [], [], []
         for match in future_matches:
             home_team = self.config_mgr.get_translation(match["home_team"])
             away_team = self.config_mgr.get_translation(match["away_team"])
-            match_date = match["date"]
-
-            home_win_prob = match["home_win_prob"]
-            away_win_prob = match["away_win_prob"]
-            draw_prob = match["draw_prob"]
             
-            odds = None
-            for (odd_home, odd_away), o in odds_lookup.items():
-                home_score = process.extractOne(home_team, [odd_home])[1]
-                away_score = process.extractOne(away_team, [odd_away])[1]
-                if home_score >= 70 and away_score >= 70:
-                    odds = o
-                    break
+            odds = self.matcher.match(home_team, away_team)
             if not odds:
                 continue
             
-            win_odds, draw_odds, loss_odds = odds["win_odds"], odds["draw_odds"], odds["loss_odds"]
-
-            ev_map = {
-                "home": (home_win_prob * (win_odds - 1)) - (1 - home_win_prob),
-                "away": (away_win_prob * (loss_odds - 1)) - (1 - away_win_prob),
-                "draw": (draw_prob * (draw_odds - 1)) - (1 - draw_prob)
-            }
-
-            side, ev = max(ev_map.items(), key=lambda x: x[1])
-            #print(ev)
-            if ev < ev_threshold:
-                continue
-            
-            side_map = {
-                "home": (home_team, win_odds, home_win_prob),
-                "draw": (f"{home_team}_{away_team}_draw", draw_odds, draw_prob),
-                "away": (away_team, loss_odds, away_win_prob)
-            }
-            bet_team, bet_odds, bet_prob = side_map[side]
-            
-            if f"{bet_team}_{match_date}" in self.placed_bets["match_id"].values:
-                continue
-            
-            bets.append({
-                "match_id": f"{bet_team}_{match_date}",
-                "search_query": f"{home_team} vs {away_team}",
-                "home_team": home_team,
-                "away_team": away_team,
-                "team": bet_team,
-                "side": side,
-                "odds": bet_odds,
-                "win_rate": bet_prob,
-                "ev": round(ev, 2),
-                "strategy": strategy,
-                "placed": False,
-                "risk": None,
-                "timestamp": match_date,
-                "hit": None,
-                "payout": None,
-                "profit": None,
-            })
-            
+            fixtures.append((home_team, away_team, match["date"]))
+            probs.append((match["home_win_prob"], match["away_win_prob"], match["draw_prob"]))
+            prices.append((odds["win_odds"], odds["loss_odds"], odds["draw_odds"]))
         
-        self.pending_bets = pd.DataFrame(bets)
+        self.matcher.save()
+        self.add_to_log(f"Odds matching: {self.matcher.summary()}", event="odds_matching", **self.matcher.stats)
         
-        self.pending_bets["risk"] = 1 + self.pending_bets["ev"] * beta
+        probs, prices = np.reshape(probs, (-1, 3)).astype(np.float64), np.reshape(prices, (-1, 3)).astype(np.float64)
+        # The model's own probabilities are stored with each bet; calibration is measured against them only.
+        model_probs = probs
+        if self.config_mgr.get_setting("calibrate_win_rates", False) and not self.calibration.empty:
+            probs = self.calibration.calibrated_probs(probs, prices)
+        scored = scoring.score_fixtures(probs, prices, ev_threshold)
+        model_win_rate = model_probs[scored["rows"], scored["side_index"]]
+        fixtures = pd.DataFrame(fixtures, columns=["home_team", "away_team", "date"], dtype=object).iloc[scored["rows"]]
+        home_team, away_team, match_date = (fixtures[col].to_numpy() for col in fixtures.columns)
+        bet_team = np.choose(scored["side_index"], [home_team, away_team, home_team + "_" + away_team + "_draw"])
+        match_id = np.array([f"{team}_{date}" for team, date in zip(bet_team, match_date)], dtype=object)
+        
+        fresh = np.array([not self.ledger.is_placed(m) for m in match_id], dtype=bool)
+        ev = np.round(scored["ev"][fresh], 2)
+        risk = scoring.size_stakes(ev, beta, weekly_exposure, initial_bankroll)
+        if self.config_mgr.get_setting("stake_sizing", "heuristic") == "kelly":
+            sizing = kelly.kelly_stakes(scored["win_rate"][fresh], scored["odds"][fresh], initial_bankroll, weekly_exposure, baseline_stakes=risk)
+            self.add_to_log(
+                f"Kelly sizing: expected log growth {sizing['kelly_growth']:.5f} against {sizing['baseline_growth']:.5f} for the heuristic stakes",
+                event="kelly_sizing", bets=len(risk), staked=int((sizing["stakes"] > 0).sum()),
+                kelly_growth=sizing["kelly_growth"], baseline_growth=sizing["baseline_growth"], iterations=sizing["iterations"],
+            )
+            risk = sizing["stakes"]
         
-        self.pending_bets["risk"] = (weekly_exposure*initial_bankroll)*(self.pending_bets["risk"]/self.pending_bets["risk"].sum()) if len(self.pending_bets) > 5  else (len(self.pending_bets)/5) * (weekly_exposure*initial_bankroll) / len(self.pending_bets)
+        self.pending_bets = pd.DataFrame({
+            "match_id": match_id[fresh],
+            "search_query": home_team[fresh] + " vs " + away_team[fresh],
+            "home_team": home_team[fresh],
+            "away_team": away_team[fresh],
+            "team": bet_team[fresh],
+            "side": scored["side"][fresh],
+            "odds": scored["odds"][fresh],
+            "win_rate": scored["win_rate"][fresh],
+            "model_win_rate": model_win_rate[fresh],
+            "ev": ev,
+            "strategy": strategy,
+            "placed": False,
+            "risk": risk,
+            "timestamp": match_date[fresh],
+            "hit": None,
+            "payout": None,
+            "profit": None,
+        })
         
-        self.pending_bets["risk"] = np.where(self.pending_bets["risk"] < 0.1, 0.1, self.pending_bets["risk"])
+        # Kelly sizing can leave bets without a stake; those are not placed at all.
+        self.pending_bets = self.pending_bets[self.pending_bets["risk"] > 0].reset_index(drop=True)
         
-        self.pending_bets["risk"] = pd.to_numeric(self.pending_bets["risk"], errors="coerce").astype(float).round(2)
+        self.ledger.clear_pending()
+        self.ledger.extend(self.pending_bets, PENDING)
         
         return self.pending_bets
         
     def save_all(self):
-        #print(self.placed_bets.tail())
-        self.new_placed_bets_df = pd.DataFrame(self.new_placed_bets)
-        self.placed_bets = pd.concat([self.placed_bets, self.new_placed_bets_df], ignore_index=True)
-        self.placed_bets.to_csv(self.data_dir / "placed_bets.csv", index=False)
-        self.past_bets.to_csv(self.data_dir / "past_bets.csv", index=False)
-        self.failed_bets.to_csv(self.data_dir / "failed_bets.csv", index=False)
+        self.add_to_log("Saving ledger.", event="save")
+        self.logger.flush()
+        if self.store is not None:
+            deletes, inserts = self.ledger.changes()
+            inserted = self.store.apply(
+                inserts={table: self.ledger.to_frame(rows=rows, columns=TABLE_COLUMNS[table]) for table, rows in inserts.items()},
+                deletes=deletes,
+            )
+            for table, rows in inserts.items():
+                self.ledger.mark_saved(rows, inserted[table])
+        else:
+            for table in STATUS_TABLES.values():
+                self._write_csv(self.ledger.table(table), table)
+            self.ledger.mark_saved()
+        # Saved after the ledger so a failed save never counts the same resolved bets twice.
+        self.calibration.save()
         
         
     def move_failed_bet(self, bet):
-        self.failed_bets.loc[len(self.failed_bets)] = self._get_bet_attrs(bet)
+        self.ledger.record(self._get_bet_attrs(bet), FAILED)
         
     def move_placed_bet(self, bet):
         #print(f"Adding: {bet.match_id}")
-        self.new_placed_bets.append(self._get_bet_attrs(bet))
-        #print(self.new_placed_bets)
+        self.ledger.record(self._get_bet_attrs(bet), PLACED)
         
     def get_pending_bet(self, row):
-        #print(row)
-        bet = models.Bet(
-            match_id=row["match_id"],
-            home_team=row["home_team"],
-            away_team=row["away_team"],
-            search_query=row["search_query"],
-            team=row["team"],
-            side=row["side"],
-            odds=row["odds"],
-            win_rate=row["win_rate"],
-            ev=row["ev"],
-            risk=row["risk"],
-            strategy=row["strategy"],
-            placed=row["placed"],
-            timestamp=row["timestamp"],
-            hit=row["hit"],
-            payout=row["payout"],
-            profit=row["profit"]
-        )
-        return bet
+        return models.Bet.from_row(row)
+    
+    def get_pending_batch(self, pending_bets):
+        return models.BetBatch.from_frame(pending_bets)
     
-    def _get_bet_attrs(self, bet, cols = ["match_id", "team", "side", "odds", "win_rate", "ev", "risk", "strategy", "placed", "timestamp", "hit", "payout", "profit"]):
-        return {k: getattr(bet, k, None) for k in cols}
+    def _get_bet_attrs(self, bet, cols = ["match_id", "team", "side", "odds", "win_rate", "model_win_rate", "ev", "risk", "strategy", "placed", "timestamp", "hit", "payout", "profit"]):
+        return bet.to_dict(cols)
     
-    def add_to_log(self, message):
-        with open(self.log_file, 'a') as f:
-            f.write(f"{datetime.now()}: {message}\n")
+    def add_to_log(self, message, event="message", match_id=None, phase=None, duration=None, **fields):
+        self.logger.log(event, message=message, match_id=match_id, phase=phase, duration=duration, **fields)
 
 if __name__ == "__main__":
     data_dir = Path(__file__).resolve().parent.parent / "data"
@@ -5,9 +5,11 @@ import time
 import random as rand
 import pandas as pd
 from utils.dataloader import DataLoader
+from engine.ledger import PLACED
 from dotenv import load_dotenv
 import os
 from datetime import datetime
+from urllib.parse import urljoin, urlparse
 
 class Executor:
     def __init__(self, data_loader) -> None:
@@ -15,9 +17,8 @@ class Executor:
         self.config_mgr = self.data_loader.config_mgr
         self.browser_mgr = self.data_loader.browser_mgr
         self.session_file = self.data_loader.session_file
-        self.past_bets = self.data_loader.past_bets
-        self.placed_bets = self.data_loader.placed_bets
-        self.failed_bets = self.data_loader.failed_bets
+        self.ledger = self.data_loader.ledger
+        self.readiness = self.browser_mgr.readiness
         load_dotenv()
         self.username = os.getenv("TOTO_USERNAME")
         self.password = os.getenv("TOTO_PASSWORD")
@@ -25,27 +26,37 @@ class Executor:
     def _place_bet(self, page, bet):
         #print(bet)
         #print(DataLoader.pending_bets)
+        start = time.perf_counter()
         page.fill("[data-testid='search-field']", f"{bet.home_team} vs {bet.away_team}")
-        time.sleep(5)
+        # The previous search's results can still be up, so wait for a result that names both teams.
+        results = page.locator("a[data-testid='selectable-event-wrapper-anchor']").locator("xpath=..")
+        target = results.filter(has_text=bet.home_team).filter(has_text=bet.away_team)
+        self.readiness.wait_locator(target.first, "search", required=False)
+        self.readiness.pause()
 
         anchors = page.locator("a[data-testid='selectable-event-wrapper-anchor']")
         count = anchors.count()
 
-        clicked = False
+        event_url = None
         for i in range(count):
             anchor = anchors.nth(i)
             parent_text = anchor.evaluate("el => el.parentElement.innerText.toLowerCase()")
 
             if bet.home_team.lower() in parent_text and bet.away_team.lower() in parent_text:
+                event_url = urljoin(page.url, anchor.get_attribute("href") or "")
                 anchor.evaluate("el => el.click()")
-                time.sleep(2)
-                clicked = True
                 break
 
-        if not clicked:
+        if event_url is None:
             print(f"Could not find anchor for {bet.home_team} vs {bet.away_team}")
-            
-        time.sleep(2)
+        else:
+            # The previous bet's event page stays rendered until this one lands: wait for its url, then for
+            # an outcome button naming the home team.
+            event_path = urlparse(event_url).path
+            self.readiness.until("event", lambda timeout: page.wait_for_url(lambda url: urlparse(url).path == event_path, wait_until="commit", timeout=timeout), required=False)
+            outcomes = page.locator("div[class*='eventMarketWrapper'] button[data-testid='outcome-button']")
+            self.readiness.wait_locator(outcomes.filter(has_text=bet.home_team).first, "market", required=False)
+            self.readiness.pause()
 
         event_wrappers = page.locator("div[class*='eventMarketWrapper']")
         for i in range(event_wrappers.count()):
@@ -71,8 +82,11 @@ class Executor:
                         continue
                 break
 
-        time.sleep(2)
-        
+        # The selection is in once its leg is added to the bet slip.
+        bet_slip = page.locator("[data-testid='leg-user-input-stake-wrapper']")
+        self.readiness.wait_locator(bet_slip.first, "selection", state="attached", required=False)
+        self.readiness.pause()
+
         viewport = page.viewport_size
         center_x = viewport["width"] // 2
         center_y = 265  # locked based on visual
@@ -81,10 +95,8 @@ class Executor:
         #risk = 0.10 # testing
 
         try:
-            bet_slip = page.locator("[data-testid='leg-user-input-stake-wrapper']")
             stake_input = bet_slip.locator("input[data-testid='stake-input']")
-            stake_input.wait_for(state="visible", timeout=5000)
-            time.sleep(1)
+            self.readiness.wait_locator(stake_input, "stake")
             #print(bet.risk)
             stake_input.fill(str(bet.risk))
             #print("found stake input")
@@ -92,20 +104,23 @@ class Executor:
             print(f"Skipping bet on {bet.home_team} vs {bet.away_team}")
             print("Moving bet to failed bets, check log for further details.")
             message = f"Skipping bet on {bet.home_team} vs {bet.away_team}. Coudn't find stake input. Error: {e}"
-            self.data_loader.add_to_log(message=message)
+            self.data_loader.add_to_log(message=message, event="bet_failed", match_id=bet.match_id, phase="stake_input", duration=time.perf_counter() - start, reason=type(e).__name__, error=str(e))
             self.data_loader.move_failed_bet(bet)
             return
 
-        time.sleep(1)
+        # The slip reprices after the stake is entered: it is ready once it can be placed, or once it asks
+        # for an odds change to be accepted.
+        self.readiness.wait(page, "button:has-text('Plaats weddenschap'):enabled, button:has-text('Accepteer alle wijzigingen')", "stake_ready", required=False)
+        self.readiness.pause()
         # Check for and accept odds changes if present before placing the bet
         try:
             accept_changes_button = page.locator("button:has-text('Accepteer alle wijzigingen')")
             if accept_changes_button.is_visible():
-                self.data_loader.add_to_log(message="Accepting odds changes before placing bet")
+                self.data_loader.add_to_log(message="Accepting odds changes before placing bet", event="odds_changed", match_id=bet.match_id, phase="confirm")
                 accept_changes_button.click()
-                time.sleep(1)
+                self.readiness.wait_locator(accept_changes_button, "odds_change", state="hidden", required=False)
         except Exception as e:
-            self.data_loader.add_to_log(message=f"Error accepting odds changes: {e}")
+            self.data_loader.add_to_log(message=f"Error accepting odds changes: {e}", event="odds_change_error", match_id=bet.match_id, phase="confirm", reason=type(e).__name__, error=str(e))
             
         #print("waiting for ok button")
         
@@ -117,9 +132,10 @@ class Executor:
         self.data_loader.move_placed_bet(bet)
         #print(self.data_loader.placed_bets)
         message = f"Placed bet succesfully on {bet.home_team} vs {bet.away_team} for {bet.risk} EUR"
-        self.data_loader.add_to_log(message=message)
-        
-        time.sleep(2)
+        self.data_loader.add_to_log(message=message, event="bet_placed", match_id=bet.match_id, phase="place", duration=time.perf_counter() - start, risk=bet.risk, odds=bet.odds)
+
+        # The next search starts once the placement has gone through and the slip is cleared.
+        self.readiness.wait_locator(bet_slip.first, "place", state="detached", required=False)
         
     def place_bets(self, pending_bets):
         #print(self.data_loader.pending_bets)
@@ -132,17 +148,18 @@ class Executor:
             page.mouse.click(10, 10)
             
             if not pending_bets.empty:
-                for idx, row in pending_bets.iterrows():
-                    bet = self.data_loader.get_pending_bet(row)
+                # Checked against the bets placed before this run, so a slate that lists a match_id twice still places both.
+                placed_before = set(self.ledger.to_frame(PLACED, ["match_id"])["match_id"])
+                for bet in self.data_loader.get_pending_batch(pending_bets):
                     try:
-                        if bet.match_id in self.placed_bets["match_id"].values:
+                        if bet.match_id in placed_before:
                             print(f"Bet on {bet.home_team} vs {bet.away_team} already placed, skipping.")
                             continue
                         self._place_bet(page, bet)
                     except Exception as e:
                         #print(f"Error placing bet: {e}")
                         message = f"Error placing bet on {bet.home_team} vs {bet.away_team}. Error: {e}"
-                        self.data_loader.add_to_log(message=message)
+                        self.data_loader.add_to_log(message=message, event="bet_failed", match_id=bet.match_id, phase="place", reason=type(e).__name__, error=str(e))
                         self.data_loader.move_failed_bet(bet)
                         continue
         finally:
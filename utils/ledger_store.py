@@ -0,0 +1,115 @@
+import argparse
+import sqlite3
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from engine.ledger import TABLE_COLUMNS
+
+LEDGER_TABLES = TABLE_COLUMNS
+REAL_COLUMNS = {"odds", "win_rate", "model_win_rate", "ev", "risk", "payout", "profit"}
+BOOL_COLUMNS = {"placed", "hit"}
+
+
+class LedgerStore():
+    def __init__(self, db_path) -> None:
+        self.db_path = Path(db_path)
+        self.conn = sqlite3.connect(self.db_path)
+        # WAL keeps readers (e.g. simulator processes) unblocked while a session is saving.
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self._create_tables()
+
+    def _create_tables(self):
+        with self.conn:
+            for table, columns in LEDGER_TABLES.items():
+                definitions = ", ".join(f"{col} {'REAL' if col in REAL_COLUMNS else 'TEXT'}" for col in columns)
+                self.conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (id INTEGER PRIMARY KEY AUTOINCREMENT, {definitions})")
+                # Databases created before a column was added to the ledger get it as an empty column.
+                existing = {row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+                for col in columns:
+                    if col not in existing:
+                        self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} {'REAL' if col in REAL_COLUMNS else 'TEXT'}")
+                self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_match_id ON {table} (match_id)")
+                self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_timestamp ON {table} (timestamp)")
+
+    def count(self, table):
+        return self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def read(self, table, columns=None, start=None, end=None):
+        columns = columns or LEDGER_TABLES[table]
+        unknown = set(columns) - set(LEDGER_TABLES[table])
+        if unknown:
+            raise ValueError(f"Unknown {table} columns: {sorted(unknown)}")
+
+        # Timestamps are ISO strings, so date ranges are plain string comparisons on the index.
+        query = f"SELECT id, {', '.join(columns)} FROM {table}"
+        clauses, params = [], []
+        if start is not None:
+            clauses.append("timestamp >= ?")
+            params.append(str(start))
+        if end is not None:
+            clauses.append("timestamp < ?")
+            params.append(str(end))
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        frame = pd.read_sql_query(query + " ORDER BY id", self.conn, params=params, index_col="id")
+
+        for col in BOOL_COLUMNS & set(columns):
+            frame[col] = frame[col].map({"1": True, "0": False, "True": True, "False": False, 1: True, 0: False}).astype(object)
+        return frame
+
+    def _rows(self, frame, columns):
+        frame = frame.reindex(columns=columns).astype(object)
+        frame = frame.where(frame.notna(), None)
+        for row in frame.itertuples(index=False, name=None):
+            yield tuple(int(v) if isinstance(v, (bool, np.bool_)) else v.item() if isinstance(v, np.generic) else v for v in row)
+
+    def apply(self, inserts=None, deletes=None):
+        # One transaction per session save: either every change lands or none does.
+        # Returns the new row ids per table, in the order the frames were given.
+        inserts = inserts or {}
+        deletes = deletes or {}
+        inserted = {}
+        with self.conn:
+            for table, ids in deletes.items():
+                self.conn.executemany(f"DELETE FROM {table} WHERE id = ?", [(int(i),) for i in ids])
+            for table, frame in inserts.items():
+                if frame is None or frame.empty:
+                    continue
+                columns = LEDGER_TABLES[table]
+                placeholders = ", ".join("?" for _ in columns)
+                query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+                inserted[table] = [self.conn.execute(query, row).lastrowid for row in self._rows(frame, columns)]
+        return inserted
+
+    def close(self):
+        self.conn.close()
+
+
+def migrate_from_csv(data_dir, db_path=None, force=False):
+    data_dir = Path(data_dir)
+    store = LedgerStore(db_path or data_dir / "ledger.sqlite")
+    if not force and any(store.count(table) for table in LEDGER_TABLES):
+        store.close()
+        raise RuntimeError(f"{store.db_path} already holds bets, pass force=True to append the csv history again")
+
+    inserts = {}
+    for table in LEDGER_TABLES:
+        csv_path = data_dir / f"{table}.csv"
+        if csv_path.exists():
+            inserts[table] = pd.read_csv(csv_path)
+    store.apply(inserts=inserts)
+    counts = {table: store.count(table) for table in LEDGER_TABLES}
+    store.close()
+    return counts
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bet ledger storage tools")
+    parser.add_argument("command", choices=["migrate"])
+    parser.add_argument("data_dir", nargs="?", default="data")
+    parser.add_argument("--db", help="Target database, defaults to <data_dir>/ledger.sqlite")
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+
+    counts = migrate_from_csv(args.data_dir, args.db, force=args.force)
+    print(f"[INFO] Migrated ledger: {counts}")
@@ -0,0 +1,135 @@
+import argparse
+import json
+from datetime import date, timedelta
+from pathlib import Path
+from thefuzz import fuzz, utils
+from utils.atomic import atomic_write
+
+
+class FixtureMatcher():
+    # Confirmed (home, away) -> odds name pairs are cached on disk and returned without scoring. A fuzzy hit is
+    # only confirmed when both names score at least confirm_score (WRatio gives substring matches 90), or when
+    # it is the only candidate over the threshold. Pairs not used for max_age_days are dropped on load.
+    def __init__(self, cache_path, threshold=70, confirm_score=95, max_age_days=60, prefix_length=3) -> None:
+        self.cache_path = Path(cache_path)
+        self.threshold = threshold
+        self.confirm_score = confirm_score
+        self.max_age_days = max_age_days
+        self.prefix_length = prefix_length
+        self.cache = self._load_cache()
+        self.entries = []
+        self.by_pair = {}
+        self.blocks = {}
+        self._names = {}
+        self.reset_stats()
+
+    def _load_cache(self):
+        if not self.cache_path.exists():
+            return {}
+        with open(self.cache_path) as f:
+            stored = json.load(f)
+        oldest = (date.today() - timedelta(days=self.max_age_days)).isoformat()
+        # Entries of the old per-team format are not pairs and are dropped.
+        return {
+            key: entry for key, entry in stored.items()
+            if isinstance(entry, dict) and entry.get("last_used", "") >= oldest
+        }
+
+    def _cache_key(self, home, away):
+        # Normalized names are alphanumeric, so "|" cannot occur in them.
+        return f"{home}|{away}"
+
+    def forget(self, home_team, away_team):
+        return self.cache.pop(self._cache_key(self.normalize(home_team), self.normalize(away_team)), None) is not None
+
+    def reset_stats(self):
+        self.stats = {"fixtures": 0, "cache_hits": 0, "scored_hits": 0, "ambiguous": 0, "misses": 0, "comparisons": 0}
+
+    def normalize(self, name):
+        # Same processing thefuzz applies before scoring, done once per distinct name.
+        if name not in self._names:
+            self._names[name] = utils.full_process(name, force_ascii=True)
+        return self._names[name]
+
+    def _block_keys(self, normalized):
+        return {token[:self.prefix_length] for token in normalized.split()}
+
+    def index_odds(self, odds_lookup):
+        self.entries = list(odds_lookup.items())
+        self.by_pair = {}
+        self.blocks = {}
+        for position, ((odd_home, odd_away), _) in enumerate(self.entries):
+            home, away = self.normalize(odd_home), self.normalize(odd_away)
+            self.by_pair.setdefault((home, away), position)
+            for key in self._block_keys(home) | self._block_keys(away):
+                self.blocks.setdefault(key, []).append(position)
+
+    def match(self, home_team, away_team):
+        self.stats["fixtures"] += 1
+        home, away = self.normalize(home_team), self.normalize(away_team)
+        key = self._cache_key(home, away)
+
+        cached = self.cache.get(key)
+        if cached is not None and (cached["home"], cached["away"]) in self.by_pair:
+            cached["last_used"] = date.today().isoformat()
+            self.stats["cache_hits"] += 1
+            return self.entries[self.by_pair[(cached["home"], cached["away"])]][1]
+
+        # Only odds entries sharing a name token prefix with either team are scored, in their
+        # original order so the first entry above the threshold still wins.
+        candidates = set()
+        for block_key in self._block_keys(home) | self._block_keys(away):
+            candidates.update(self.blocks.get(block_key, ()))
+
+        hit = None
+        for position in sorted(candidates):
+            (odd_home, odd_away), odds = self.entries[position]
+            self.stats["comparisons"] += 1
+            odd_home, odd_away = self.normalize(odd_home), self.normalize(odd_away)
+            home_score = fuzz.WRatio(home, odd_home, full_process=False)
+            if home_score < self.threshold:
+                continue
+            away_score = fuzz.WRatio(away, odd_away, full_process=False)
+            if away_score < self.threshold:
+                continue
+            if hit is not None:
+                # A second candidate over the threshold: the first one is still used, but not confirmed.
+                self.stats["ambiguous"] += 1
+                return hit[1]
+            hit = ((odd_home, odd_away), odds)
+            if min(home_score, away_score) >= self.confirm_score:
+                break
+
+        if hit is None:
+            self.stats["misses"] += 1
+            return None
+        (odd_home, odd_away), odds = hit
+        self.cache[key] = {"home": odd_home, "away": odd_away, "last_used": date.today().isoformat()}
+        self.stats["scored_hits"] += 1
+        return odds
+
+    def save(self):
+        with atomic_write(self.cache_path) as f:
+            json.dump(self.cache, f, indent=2, sort_keys=True)
+
+    def summary(self):
+        return ", ".join(f"{key}={value}" for key, value in self.stats.items())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Confirmed fixture-to-odds name pairs")
+    parser.add_argument("command", choices=["show", "forget", "clear"])
+    parser.add_argument("teams", nargs="*", help="home and away team for forget")
+    parser.add_argument("--cache", default="data/match_cache.json")
+    args = parser.parse_args()
+
+    matcher = FixtureMatcher(args.cache)
+    if args.command == "forget":
+        if len(args.teams) != 2:
+            parser.error("forget needs the home and away team")
+        print(f"[INFO] Forgot {' vs '.join(args.teams)}" if matcher.forget(*args.teams) else f"[INFO] {' vs '.join(args.teams)} is not cached")
+    elif args.command == "clear":
+        matcher.cache = {}
+    if args.command != "show":
+        matcher.save()
+    for key, entry in sorted(matcher.cache.items()):
+        print(f"{key.replace('|', ' vs '):<50} -> {entry['home']} vs {entry['away']}  (last used {entry['last_used']})")
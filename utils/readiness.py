@@ -0,0 +1,78 @@
+import random as rand
+import time
+from collections import deque
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+CAPTCHA_FRAME = "iframe[src*='hcaptcha.com']"
+
+
+class Readiness():
+    # Waits on page conditions (a selector, network idle) instead of fixed sleeps. Each condition has its
+    # own timeout, adapted to how long it recently took: factor x the slowest recent wait, within
+    # [min_timeout, max_timeout]. Jitter is a separate anti-bot pause and is off unless configured.
+    def __init__(self, config_mgr) -> None:
+        self.initial_timeout = config_mgr.get_setting("readiness_timeout", 10.0)
+        self.min_timeout = config_mgr.get_setting("readiness_min_timeout", 2.0)
+        self.max_timeout = config_mgr.get_setting("readiness_max_timeout", 20.0)
+        self.factor = config_mgr.get_setting("readiness_factor", 3.0)
+        self.jitter = tuple(config_mgr.get_setting("page_jitter", [0.0, 0.0]))
+        self._samples = {}
+        self._timeouts = {}
+
+    def timeout(self, key):
+        samples = self._samples.get(key)
+        if not samples:
+            return self.initial_timeout
+        return min(self.max_timeout, max(self.min_timeout, self.factor * max(samples)))
+
+    def record(self, key, seconds):
+        self._samples.setdefault(key, deque(maxlen=20)).append(seconds)
+
+    def record_timeout(self, key):
+        # Misses are counted but not sampled, so a condition that rarely shows up does not inflate its timeout.
+        self._timeouts[key] = self._timeouts.get(key, 0) + 1
+
+    def jitter_seconds(self):
+        low, high = self.jitter
+        return rand.uniform(low, high) if high > 0 else 0.0
+
+    def wait(self, page, selector, key, state="visible", required=True):
+        return self.wait_locator(page.locator(selector).first, key, state, required)
+
+    def wait_locator(self, locator, key, state="visible", required=True):
+        return self.until(key, lambda timeout: locator.wait_for(state=state, timeout=timeout), required)
+
+    def settle(self, page, key):
+        # Only meaningful right after a navigation: later on the page is usually idle already, so an action's
+        # effect has to be waited on directly. Pages that keep polling never get there, so a miss is not an error.
+        return self.until(key, lambda timeout: page.wait_for_load_state("networkidle", timeout=timeout), required=False)
+
+    def until(self, key, condition, required=True):
+        # condition(timeout_ms) is any Playwright wait (wait_for, wait_for_url, ...) that raises on timeout.
+        start = time.perf_counter()
+        try:
+            condition(self.timeout(key) * 1000)
+        except PlaywrightTimeoutError:
+            self.record_timeout(key)
+            if required:
+                raise
+            return False
+        self.record(key, time.perf_counter() - start)
+        return True
+
+    def pause(self):
+        seconds = self.jitter_seconds()
+        if seconds:
+            time.sleep(seconds)
+
+    def report(self):
+        report = {}
+        for key in sorted(set(self._samples) | set(self._timeouts)):
+            samples = self._samples.get(key, ())
+            report[key] = {
+                "waits": len(samples),
+                "mean": sum(samples) / len(samples) if samples else None,
+                "timeout": self.timeout(key),
+                "timeouts": self._timeouts.get(key, 0),
+            }
+        return report
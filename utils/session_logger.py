@@ -0,0 +1,180 @@
+import argparse
+import atexit
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class SessionLogger():
+    # Structured JSON lines written by a background thread; callers only put records on a queue.
+    def __init__(self, logs_dir, flush_interval=1.0, batch_size=256, retention=None) -> None:
+        self.logs_dir = Path(logs_dir)
+        os.makedirs(self.logs_dir, exist_ok=True)
+        rotate_logs(self.logs_dir, retention)
+
+        self.path = self._session_path()
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        self._file = open(self.path, "a", encoding="utf-8")
+        # Held for the whole session, so other processes rotating the logs leave this file alone.
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._thread = threading.Thread(target=self._run, name="session-logger", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        self.log("session_start")
+
+    def _session_path(self):
+        name = f"session_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}"
+        path, n = self.logs_dir / f"{name}.jsonl", 1
+        while path.exists() or Path(f"{path}.gz").exists():
+            path, n = self.logs_dir / f"{name}_{n}.jsonl", n + 1
+        return path
+
+    def log(self, event, message=None, match_id=None, phase=None, duration=None, **fields):
+        record = {"time": datetime.now().isoformat(), "event": event, "message": message, "match_id": match_id, "phase": phase, "duration": duration}
+        record.update(fields)
+        self._queue.put({key: value for key, value in record.items() if value is not None})
+
+    def _write(self, records):
+        if records:
+            self._file.write("".join(json.dumps(record, default=str) + "\n" for record in records))
+            self._file.flush()
+
+    def _run(self):
+        # Batches whatever is queued, writing at least every flush_interval seconds. A threading.Event
+        # on the queue is a flush request and is set once everything queued before it is on disk;
+        # None stops the writer.
+        records = []
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self._write(records)
+                records = []
+                continue
+            if isinstance(item, dict):
+                records.append(item)
+                if len(records) < self.batch_size:
+                    continue
+            self._write(records)
+            records = []
+            if item is None:
+                return
+            if isinstance(item, threading.Event):
+                item.set()
+
+    def flush(self):
+        if not self._thread.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def close(self):
+        if self._thread.is_alive():
+            self.log("session_end")
+            self._queue.put(None)
+            self._thread.join()
+        if not self._file.closed:
+            self._file.close()
+        atexit.unregister(self.close)
+
+
+def rotate_logs(logs_dir, retention=None, min_idle=600):
+    # Earlier sessions are gzipped; with a retention only the newest that many sessions are kept. A log still
+    # locked by a running session, or written to in the last min_idle seconds, is left as it is.
+    logs_dir = Path(logs_dir)
+    for path in sorted(logs_dir.glob("session_*.jsonl")) + sorted(logs_dir.glob("session_*.txt")):
+        try:
+            if time.time() - path.stat().st_mtime < min_idle:
+                continue
+            src = open(path, "rb")
+        except FileNotFoundError:
+            # Rotated by another process in the meantime.
+            continue
+        with src:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(src, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    continue
+            if not path.exists():
+                continue
+            with gzip.open(f"{path}.gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            path.unlink()
+    if retention is not None:
+        sessions = sorted(logs_dir.glob("session_*.gz"), key=lambda path: path.name)
+        for path in sessions[:max(len(sessions) - retention, 0)]:
+            path.unlink()
+
+def read_logs(logs_dir):
+    records = []
+    for path in sorted(Path(logs_dir).glob("session_*.jsonl*")):
+        opener = gzip.open if path.suffix == ".gz" else open
+        session = path.name.split(".")[0]
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A session killed mid-write can leave a partial last line.
+                    continue
+                record["session"] = session
+                records.append(record)
+    frame = pd.DataFrame(records)
+    if not frame.empty:
+        frame["time"] = pd.to_datetime(frame["time"], format="ISO8601")
+    return frame
+
+def failure_reasons(records):
+    if records.empty or "reason" not in records:
+        return pd.DataFrame(columns=["event", "phase", "reason", "count"])
+    failures = records[records["reason"].notna()]
+    return failures.groupby(["event", "phase", "reason"], dropna=False).size().rename("count").reset_index().sort_values("count", ascending=False, ignore_index=True)
+
+def timings(records):
+    if records.empty or "duration" not in records:
+        return pd.DataFrame(columns=["event", "phase", "count", "mean", "p50", "p95", "max"])
+    timed = records[records["duration"].notna()]
+    grouped = timed.groupby(["event", "phase"], dropna=False)["duration"]
+    return pd.DataFrame({
+        "count": grouped.size(),
+        "mean": grouped.mean(),
+        "p50": grouped.median(),
+        "p95": grouped.quantile(0.95),
+        "max": grouped.max(),
+    }).reset_index()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aggregate structured session logs")
+    parser.add_argument("command", choices=["failures", "timings", "events"])
+    parser.add_argument("logs_dir", nargs="?", default="data/logs")
+    parser.add_argument("--since", help="Only include records at or after this date")
+    args = parser.parse_args()
+
+    records = read_logs(args.logs_dir)
+    if args.since and not records.empty:
+        records = records[records["time"] >= pd.Timestamp(args.since)]
+
+    pd.set_option("display.max_columns", None)
+    if args.command == "failures":
+        print(failure_reasons(records).to_string(index=False))
+    elif args.command == "timings":
+        print(timings(records).to_string(index=False))
+    else:
+        print(records["event"].value_counts().to_string() if not records.empty else "No records")